@@ -0,0 +1,155 @@
+# Benchmark of the xcomcan client against the in-process simulated installation, no CAN hardware needed
+# Run this script using 'python benchmarks/bench_client.py --output results.json', the xcomcan package of this
+#   repository is benchmarked even if another one is installed, and compare the JSON results between releases
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import struct
+import sys
+import time
+import tracemalloc
+
+# benchmark the working tree rather than an installed xcomcan package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from xcomcan.addresses import *
+from xcomcan.client import StuCanPublicClient
+from xcomcan.node import StuCanPublicNode, ReadUserInfoResponse, ReadParameterResponse, WriteParameterResponse
+from xcomcan.node import MessageNotification, ReadUserInfoRequest, ReadParameterRequest
+from xcomcan.simulator import SimulatedInstallation, SimulatedDevice
+
+SOURCE_ADDRESS = 0x00
+
+
+def make_installation(latency):
+    devices = [SimulatedDevice(XT_GROUP_DEVICE_ID + i, {3000 + j: 48.0 + j for j in range(64)}, {1286: 230.0},
+                               latency=latency) for i in range(1, 10)]
+    devices += [SimulatedDevice(VT_GROUP_DEVICE_ID + i, {11000 + j: float(j) for j in range(32)}, {10002: 56.0},
+                                latency=latency) for i in range(1, 16)]
+    return SimulatedInstallation(devices, seed=0)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+
+    def at(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    return {'count': len(samples), 'mean_us': statistics.mean(samples) * 1e6, 'p50_us': at(0.50) * 1e6,
+            'p90_us': at(0.90) * 1e6, 'p99_us': at(0.99) * 1e6, 'max_us': samples[-1] * 1e6}
+
+
+def bench_latency(client, count):
+    operations = {
+        'read_user_info': lambda: client.read_user_info(XT_1_DEVICE_ID, 3000),
+        'read_parameter': lambda: client.read_parameter(XT_1_DEVICE_ID, 1286, PARAMETER_PART_FLASH),
+        'write_parameter': lambda: client.write_parameter(XT_1_DEVICE_ID, 1286, PARAMETER_PART_RAM, 230.0),
+    }
+    results = {}
+    for name, operation in operations.items():
+        samples = []
+        for i in range(count):
+            start = time.perf_counter()
+            operation()
+            samples.append(time.perf_counter() - start)
+        results[name] = percentiles(samples)
+    return results
+
+
+def bench_throughput(client, duration):
+    items = [(XT_GROUP_DEVICE_ID + i, 3000 + j) for i in range(1, 10) for j in range(64)]
+    items += [(VT_GROUP_DEVICE_ID + i, 11000 + j) for i in range(1, 16) for j in range(32)]
+    requests = errors = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        values, failures = client.read_user_infos(items, window=32)
+        requests += len(items)
+        errors += len(failures)
+    elapsed = time.perf_counter() - start
+    return {'requests': requests, 'errors': errors, 'requests_per_s': requests / elapsed}
+
+
+class NullDriver:
+    def send(self, identifier, data, is_extended_id=False):
+        pass
+
+
+def bench_rx(count, foreign_ratio, matched=True):
+    node = StuCanPublicNode(NullDriver(), SOURCE_ADDRESS)
+    for service in (ReadUserInfoResponse, WriteParameterResponse, ReadParameterResponse, MessageNotification):
+        node.add_service(service)
+    own = [((SOURCE_ADDRESS << 19) + (XT_1_DEVICE_ID << 9), struct.pack('>Hf', 3000, 48.0)),
+           ((SOURCE_ADDRESS << 19) + (XT_1_DEVICE_ID << 9) + (0x1 << 6), struct.pack('>HBf', 1286, 0, 230.0)),
+           ((SOURCE_ADDRESS << 19) + (XT_1_DEVICE_ID << 9) + (0x3 << 6), struct.pack('>HI', 12, 0))]
+    # background traffic of the bus (RCC, Xcom and other nodes) not addressed to the client
+    foreign = [((RCC_1_DEVICE_ID << 19) + (BSP_DEVICE_ID << 9) + (0x2 << 6), bytes(8))]
+    rounds = count // (len(own) * (1 + foreign_ratio))
+    frames = (own + foreign * (len(own) * foreign_ratio)) * rounds
+    if matched:
+        # the responses resolve requests submitted beforehand, outside of the congestion window so that no request
+        # is sent while measuring
+        for i in range(rounds):
+            node.submit(XT_1_DEVICE_ID, ReadUserInfoRequest(3000), congestion_control=False)
+            node.submit(XT_1_DEVICE_ID, ReadParameterRequest(1286, 0), congestion_control=False)
+    handle_rx_frame = node.handle_rx_frame
+    start = time.perf_counter()
+    for identifier, data in frames:
+        handle_rx_frame(identifier, data, len(data), None, 0)
+    elapsed = time.perf_counter() - start
+    assert not matched or not node.pending
+    return {'frames': len(frames), 'foreign_ratio': foreign_ratio, 'matched': matched,
+            'frames_per_s': len(frames) / elapsed}
+
+
+def bench_memory(client, rounds, requests_per_round):
+    gc.collect()
+    tracemalloc.start()
+    snapshots = []
+    for i in range(rounds):
+        for j in range(requests_per_round):
+            client.node.wait_response(XT_1_DEVICE_ID, ReadUserInfoRequest(3000 + j % 64), 1)
+        gc.collect()
+        snapshots.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    return {'rounds': rounds, 'requests_per_round': requests_per_round, 'traced_bytes': snapshots,
+            'growth_bytes': snapshots[-1] - snapshots[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='xcomcan client benchmark against a simulated installation')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated device latency in seconds')
+    parser.add_argument('--count', type=int, default=2000, help='samples per latency benchmark')
+    parser.add_argument('--duration', type=float, default=3.0, help='duration of the throughput benchmark')
+    parser.add_argument('--rx-frames', type=int, default=200000, help='frames of the receive benchmark')
+    parser.add_argument('--memory-rounds', type=int, default=10, help='rounds of the memory benchmark')
+    parser.add_argument('--output', help='JSON result file, default to stdout')
+    arguments = parser.parse_args()
+
+    results = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': vars(arguments),
+    }
+    with StuCanPublicClient(SOURCE_ADDRESS, driver=make_installation(arguments.latency)) as client:
+        results['latency'] = bench_latency(client, arguments.count)
+        results['throughput'] = bench_throughput(client, arguments.duration)
+        results['memory'] = bench_memory(client, arguments.memory_rounds, arguments.count)
+    results['rx'] = {'own_only': bench_rx(arguments.rx_frames, 0),
+                     'with_background_traffic': bench_rx(arguments.rx_frames, 4),
+                     'unexpected_responses': bench_rx(arguments.rx_frames, 0, matched=False)}
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == "__main__":
+    main()
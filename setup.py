@@ -41,6 +41,7 @@ setuptools.setup(
     ],
     python_requires='>=3.6.8',
     install_requires=['stucancommon>=0.9.1'],
+    extras_require={'analysis': ['numpy']},
     # these are optional and override conf.py settings
     command_options={
         'build_sphinx': {
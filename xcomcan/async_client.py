@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Asyncio counterpart of :class:`xcomcan.client.StuCanPublicClient`.
+
+The CAN node keeps running in its own receiving thread, responses are handed over to the event loop which resolves
+the awaiting futures. Any number of coroutines can therefore share a single node without one thread per caller.
+"""
+
+import asyncio
+from time import monotonic
+from stucancommon.driver import PythonCanDriver
+from stucancommon.node import Timeout
+from .node import StuCanPublicNode, StuCanPublicError
+from .node import ReadUserInfoRequest, ReadUserInfoResponse
+from .node import WriteParameterRequest, WriteParameterResponse
+from .node import ReadParameterRequest, ReadParameterResponse
+from .node import MessageNotification
+from .capture import FrameCapture
+from .client import DEFAULT_TIMEOUT
+
+
+class AsyncStuCanPublicClient:
+    """
+    Class representing an asyncio StuCan public client
+    """
+
+    def __init__(self, source_address, can_bus_speed=125000, bustype='kvaser', debug=False, driver=None,
+                 capture_path=None, round_trip_times=None, name=None):
+        """
+        Parameters
+        ----------
+        source_address : int
+            Client source address
+        can_bus_speed : int
+            CAN bus speed as selected with dip-switches inside the XcomCAN device
+        bustype: string
+            Name of the CAN interface used, refer to : `python-can <https://python-can.readthedocs.io/en/master/configuration.html#interface-names>`_
+        debug : boolean
+            Enable debug traces
+        driver : object
+            Optional driver used instead of `PythonCanDriver`, e.g. a
+            :class:`xcomcan.simulator.SimulatedInstallation`
+        capture_path : string
+            Optional file where every frame received and sent is captured, refer to
+            :class:`xcomcan.capture.FrameCapture`
+        round_trip_times : RoundTripTimes
+            Optional estimator of the round-trip time to each device, when given the requests without explicit
+            timeout use a timeout derived from it instead of DEFAULT_TIMEOUT, refer to
+            :class:`xcomcan.node.RoundTripTimes`
+        name : string
+            Name of the node logger below "xcomcan.node", default to the source address
+
+        Example
+        -------
+        .. code-block:: python
+
+            # Usage of async with statement mandatory
+            ...
+            async with AsyncStuCanPublicClient(YourClientAddress, YourCanBusSpeed, YourInterface) as client:
+                results = await asyncio.gather(client.read_user_info(XT_1_DEVICE_ID, 3000),
+                                               client.read_user_info(VT_1_DEVICE_ID, 11000))
+                print('results:', results)
+            ...
+        """
+        self.source_address = source_address
+        self.can_bus_speed = can_bus_speed
+        self.bustype = bustype
+        self.debug = debug
+        self.driver = driver
+        self.capture_path = capture_path
+        self.capture = None
+        self.round_trip_times = round_trip_times
+        self.name = name
+
+    async def __aenter__(self):
+        """
+        Initialize PythonCanDriver and StuCanPublicNode. Add required Response services to the node.
+        """
+        can_driver = self.driver if self.driver is not None else PythonCanDriver(self.can_bus_speed, self.bustype)
+        self.node = StuCanPublicNode(can_driver, self.source_address, self.debug,
+                                     round_trip_times=self.round_trip_times, name=self.name)
+        self.node.add_service(ReadUserInfoResponse)
+        self.node.add_service(WriteParameterResponse)
+        self.node.add_service(ReadParameterResponse)
+        self.node.add_service(MessageNotification)
+        if self.capture_path is not None:
+            self.capture = FrameCapture(self.capture_path)
+            self.node.frame_trace = self.capture
+        self.node.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """
+        Stop the CAN node and wait Thread to terminate without blocking the event loop
+        """
+        self.node.stop()
+        await asyncio.get_event_loop().run_in_executor(None, self.node.join)
+        if self.capture is not None:
+            self.capture.close()
+
+    def request_timeout(self, destination_address, timeout=None):
+        """
+        Retreive the response timeout of a request
+
+        Parameters
+        ----------
+        destination_address : int
+            Targeted device address
+
+        timeout : float
+            Explicit timeout, returned as is when given
+
+        Returns
+        -------
+        float
+            Timeout in seconds, derived from the round-trip times to the device when the client was created with
+            `round_trip_times`, DEFAULT_TIMEOUT otherwise
+        """
+        if timeout is not None:
+            return timeout
+        if self.round_trip_times is not None:
+            return self.round_trip_times.timeout(destination_address)
+        return DEFAULT_TIMEOUT
+
+    async def wait_response(self, destination_address, request, timeout=1):
+        """
+        Send a service and await its response, can raise a timeout exception a StuCanPublicError or return the
+        response when successfull
+
+        Parameters
+        ----------
+        destination_address : int
+            Targeted device address
+
+        request : Request
+            Request service object
+
+        timeout : float
+            Response timeout, default to 1 second, None to wait forever
+
+        Returns
+        -------
+        Response
+            Response object of the service
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def resolve(pending):
+            if future.done():
+                return
+            if isinstance(pending.response, StuCanPublicError):
+                future.set_exception(pending.response)
+            else:
+                future.set_result(pending.response)
+
+        pending = self.node.submit(destination_address, request)
+        pending.add_done_callback(lambda pending: loop.call_soon_threadsafe(resolve, pending))
+        try:
+            # the timeout is counted from the transmission, or from the submission while the request is queued
+            # behind the congestion window
+            while timeout is not None:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), pending.deadline(timeout) - monotonic())
+                except asyncio.TimeoutError:
+                    if pending.deadline(timeout) <= monotonic():
+                        raise Timeout() from None
+            return await future
+        finally:
+            if not pending.done():
+                self.node.cancel(pending)
+
+    async def read_user_info(self, destination_address, info_id, timeout=None):
+        """
+        Allow to read a Studer User Info from a targeted device, see
+        :meth:`xcomcan.client.StuCanPublicClient.read_user_info`
+
+        Parameters
+        ----------
+        destination_address : int
+            Targeted device address
+
+        info_id : int
+            User Info id number
+
+        timeout : float
+            Response timeout, default to the one given by :meth:`request_timeout`
+
+        Returns
+        -------
+        float
+            User Info value
+        """
+        response = await self.wait_response(destination_address, ReadUserInfoRequest(info_id),
+                                             self.request_timeout(destination_address, timeout))
+        return response.value
+
+    async def write_parameter(self, destination_address, parameter_id, part, value, timeout=None):
+        """
+        Allow to write a Studer Parameter on a targeted device, see
+        :meth:`xcomcan.client.StuCanPublicClient.write_parameter`
+
+        Parameters
+        ----------
+        destination_address : int
+            Targeted device address
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH or PARAMETER_PART_RAM
+
+        value : int
+            The value to write
+
+        timeout : float
+            Response timeout, default to the one given by :meth:`request_timeout`
+
+        Returns
+        -------
+        int
+            Parameter identifier that has been written
+        """
+        request = WriteParameterRequest(parameter_id, part, value)
+        response = await self.wait_response(destination_address, request,
+                                            self.request_timeout(destination_address, timeout))
+        return response.parameter_id
+
+    async def read_parameter(self, destination_address, parameter_id, part, timeout=None):
+        """
+        Allow to read a Studer Parameter from a targeted device, see
+        :meth:`xcomcan.client.StuCanPublicClient.read_parameter`
+
+        Parameters
+        ----------
+        destination_address : int
+            Targeted device address
+
+        parameter_id : int
+            Paramter id number
+
+        part : int
+            PARAMETER_PART_FLASH, PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX or PARAMETER_PART_RAM
+
+        timeout : float
+            Response timeout, default to the one given by :meth:`request_timeout`
+
+        Returns
+        -------
+        float
+            Parameter value
+        """
+        request = ReadParameterRequest(parameter_id, part)
+        response = await self.wait_response(destination_address, request,
+                                            self.request_timeout(destination_address, timeout))
+        return response.value
+
+    async def stream_messages(self, since=None, timeout=None):
+        """
+        Asynchronous iterator over the messages as soon as they happen on the CAN bus
+
+        Parameters
+        ----------
+        since : int
+            Sequence number of the last message already seen, default to only yield messages received from now on
+
+        timeout : float
+            Stop the iteration when no message arrives within this time in seconds, None to iterate until the client
+            exits
+
+        Yields
+        ------
+        tuple
+            (source_address, message)
+
+        Example
+        -------
+        .. code-block:: python
+
+            async for source_address, message in client.stream_messages():
+                print('message', message.message_id, 'from', source_address)
+        """
+        loop = asyncio.get_event_loop()
+        event = asyncio.Event()
+        notifications = self.node.notifications
+
+        def listener():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # the loop is closed, the generator has been abandoned without aclose()
+                notifications.remove_listener(listener)
+
+        sequence = notifications.sequence if since is None else since
+        notifications.add_listener(listener)
+        try:
+            while True:
+                event.clear()
+                entries = notifications.since(sequence)
+                if not entries:
+                    if notifications.closed:
+                        return
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        return
+                    continue
+                for sequence, source_address, message in entries:
+                    yield source_address, message
+        finally:
+            notifications.remove_listener(listener)
+
+    def messages(self, since=None):
+        """
+        Allow to retreive the list of messages previously happened on the CAN bus
+
+        Parameters
+        ----------
+        since : int
+            Sequence number of the last message already seen, when given only newer messages are returned as
+            (sequence, source_address, message) tuples
+
+        Returns
+        -------
+        list
+            Notification messages
+        """
+        return self.node.messages(since)
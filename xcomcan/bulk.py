@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bulk decoding of capture files with NumPy.
+
+A capture written by :class:`xcomcan.capture.FrameCapture` is memory-mapped as a NumPy structured array and every
+frame is decoded at once with vectorized operations: addresses, service id and error flag are extracted from the
+29-bit identifiers and the object id, part, value and code from the payloads. This is the tool of choice to analyse
+captures of millions of frames, :class:`xcomcan.capture.ReplayDriver` replays them frame by frame through a node.
+
+NumPy is an optional dependency, install it with ``pip install xcomcan[analysis]``.
+"""
+
+import os
+from .capture import CAPTURE_MAGIC, CAPTURE_RECORD
+
+try:
+    import numpy
+except ImportError:  # optional dependency, only required by this module
+    numpy = None
+
+DIRECTION_RX = 0
+"""
+Direction code of a received frame
+"""
+DIRECTION_TX = 1
+"""
+Direction code of a sent frame
+"""
+
+CAPTURE_FIELDS = [('timestamp', '<f8'), ('identifier', '<u4'), ('direction', 'u1'), ('dlc', 'u1'),
+                  ('data', 'u1', (8,))]
+"""
+NumPy dtype description of a capture record, refer to :data:`xcomcan.capture.CAPTURE_RECORD`
+"""
+
+DECODED_FIELDS = [('timestamp', 'f8'), ('direction', 'u1'), ('destination_address', 'u2'),
+                  ('source_address', 'u2'), ('service_id', 'u1'), ('error', 'bool'), ('object_id', 'u2'),
+                  ('part', 'u1'), ('value', 'f4'), ('code', 'u4')]
+"""
+NumPy dtype description of a decoded frame. `part` is only meaningful for the parameter services, `value` is NaN
+for frames without a float value (errors, messages and read requests) and `code` holds the error code of the error
+frames and the value of the message notifications
+"""
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError('xcomcan.bulk requires numpy, install it with "pip install xcomcan[analysis]"')
+
+
+def load_capture(path):
+    """
+    Memory-map a capture file without reading it
+
+    Parameters
+    ----------
+    path : string
+        Location of the capture file
+
+    Returns
+    -------
+    numpy.ndarray
+        Read-only structured array of CAPTURE_FIELDS records, a partial last record is left out
+    """
+    _require_numpy()
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError('{} is not a capture file'.format(path))
+    dtype = numpy.dtype(CAPTURE_FIELDS)
+    assert dtype.itemsize == CAPTURE_RECORD.size
+    count = (os.path.getsize(path) - len(CAPTURE_MAGIC)) // dtype.itemsize
+    if count == 0:
+        return numpy.zeros(0, dtype)
+    return numpy.memmap(path, dtype, mode='r', offset=len(CAPTURE_MAGIC), shape=(count,))
+
+
+def _big_endian(data, start, dtype):
+    size = numpy.dtype(dtype).itemsize
+    return numpy.ascontiguousarray(data[:, start:start + size]).view(dtype).ravel()
+
+
+def decode_frames(frames):
+    """
+    Decode captured frames with vectorized operations
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        Structured array of CAPTURE_FIELDS records, e.g. returned by `load_capture` or a slice of it
+
+    Returns
+    -------
+    numpy.ndarray
+        Structured array of DECODED_FIELDS records, one per frame
+
+    Example
+    -------
+    .. code-block:: python
+
+        frames = decode_frames(load_capture('field.xcap'))
+        # battery voltage of the first Xtender
+        mask = ((frames['direction'] == DIRECTION_RX) & (frames['source_address'] == XT_1_DEVICE_ID) &
+                (frames['service_id'] == 0x0) & ~frames['error'] & (frames['object_id'] == 3000))
+        timestamps, voltages = frames['timestamp'][mask], frames['value'][mask]
+    """
+    _require_numpy()
+    identifier = frames['identifier']
+    data = frames['data']
+    decoded = numpy.empty(len(frames), numpy.dtype(DECODED_FIELDS))
+    decoded['timestamp'] = frames['timestamp']
+    decoded['direction'] = frames['direction']
+    decoded['destination_address'] = (identifier >> 19) & 0x3FF
+    decoded['source_address'] = (identifier >> 9) & 0x3FF
+    service_id = ((identifier >> 6) & 0x7).astype('u1')
+    decoded['service_id'] = service_id
+    error = (identifier & 0x1).astype(bool)
+    decoded['error'] = error
+    decoded['object_id'] = _big_endian(data, 0, '>u2')
+
+    # '>HBf' parameter services, '>Hf' read user info and '>HI' errors and message notifications
+    parameter = ~error & ((service_id == 0x1) | (service_id == 0x2))
+    user_info = ~error & (service_id == 0x0)
+    coded = error | (service_id == 0x3)
+    dlc = frames['dlc']
+    decoded['part'] = numpy.where(parameter, data[:, 2], 0)
+    value = numpy.full(len(frames), numpy.nan, 'f4')
+    has_value = parameter & (dlc >= 7)
+    value[has_value] = _big_endian(data[has_value], 3, '>f4')
+    has_value = user_info & (dlc >= 6)
+    value[has_value] = _big_endian(data[has_value], 2, '>f4')
+    decoded['value'] = value
+    decoded['code'] = numpy.where(coded & (dlc >= 6), _big_endian(data, 2, '>u4'), 0)
+    return decoded
+
+
+def decode_capture(path, chunk_frames=1 << 20):
+    """
+    Decode a capture file chunk by chunk, the memory used is bounded whatever the size of the file
+
+    Parameters
+    ----------
+    path : string
+        Location of the capture file
+
+    chunk_frames : int
+        Number of frames decoded at once
+
+    Yields
+    ------
+    numpy.ndarray
+        Structured arrays of DECODED_FIELDS records, in capture order
+    """
+    frames = load_capture(path)
+    for start in range(0, len(frames), chunk_frames):
+        yield decode_frames(frames[start:start + chunk_frames])
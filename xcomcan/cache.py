@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Read cache for User Infos and Parameters.
+
+Values are kept for a time-to-live configurable per object id and the cache is bounded, the least recently used
+entries being evicted first. The client invalidates the cached Parameter values on a successful write.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from .addresses import PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX
+from .node import group_of
+
+USER_INFO = 'user_info'
+"""
+Kind of cache entry holding a User Info value
+"""
+PARAMETER = 'parameter'
+"""
+Kind of cache entry holding a Parameter value
+"""
+
+
+class ReadCache:
+    """
+    Class representing a TTL and LRU bounded cache of values read on the CAN bus
+
+    Attributes
+    ----------
+    hits : int
+        Number of reads served from the cache
+    misses : int
+        Number of reads that went to the CAN bus
+    """
+
+    def __init__(self, default_ttl=1.0, user_info_ttls=None, parameter_ttls=None, max_entries=4096):
+        """
+        Parameters
+        ----------
+        default_ttl : float
+            Time-to-live of a cached value in seconds, 0 disables caching of ids without a dedicated TTL
+
+        user_info_ttls : dict
+            Time-to-live in seconds keyed by User Info id, overrides default_ttl
+
+        parameter_ttls : dict
+            Time-to-live in seconds keyed by Parameter id, overrides default_ttl
+
+        max_entries : int
+            Maximum number of cached values
+
+        Example
+        -------
+        .. code-block:: python
+
+            # AC output power changes quickly, temperature slowly
+            cache = ReadCache(default_ttl=1, user_info_ttls={3136: 0.1, 3032: 30})
+            with StuCanPublicClient(0x00, CAN_BUS_SPEED, bustype='kvaser', cache=cache) as client:
+                ...
+        """
+        assert max_entries >= 1
+        self.default_ttl = default_ttl
+        self.ttls = {USER_INFO: dict(user_info_ttls or {}), PARAMETER: dict(parameter_ttls or {})}
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def ttl(self, kind, object_id):
+        """
+        Parameters
+        ----------
+        kind : string
+            USER_INFO or PARAMETER
+
+        object_id : int
+            User Info or Parameter id number
+
+        Returns
+        -------
+        float
+            Time-to-live in seconds of the values of this object
+        """
+        return self.ttls[kind].get(object_id, self.default_ttl)
+
+    def get(self, key):
+        """
+        Retreive a cached value
+
+        Parameters
+        ----------
+        key : tuple
+            (USER_INFO, address, info_id) or (PARAMETER, address, parameter_id, part)
+
+        Returns
+        -------
+        tuple
+            (True, value) when the value is cached and fresh, (False, None) otherwise
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value, generation=None):
+        """
+        Store a value read on the CAN bus
+
+        Parameters
+        ----------
+        key : tuple
+            (USER_INFO, address, info_id) or (PARAMETER, address, parameter_id, part)
+
+        value : float
+            Value read
+
+        generation : int
+            Value of ReadCache.generation when the read was sent, the value is dropped if a Parameter has been
+            invalidated meanwhile as it may have been read before the write
+        """
+        ttl = self.ttl(key[0], key[2])
+        if ttl <= 0:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate_parameter(self, address, parameter_id):
+        """
+        Forget the cached values of a Parameter after it has been written, min and max values are kept as a write
+        does not change them
+
+        Parameters
+        ----------
+        address : int
+            Device address, a group address invalidates every device of the group
+
+        parameter_id : int
+            Parameter id number
+        """
+        with self.lock:
+            self.generation += 1
+            for key in [key for key in self.entries if key[0] == PARAMETER and key[2] == parameter_id]:
+                if key[3] in (PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX):
+                    continue
+                if key[1] == address or group_of(key[1]) == address:
+                    del self.entries[key]
+
+    def clear(self):
+        """
+        Forget every cached value
+        """
+        with self.lock:
+            self.entries.clear()
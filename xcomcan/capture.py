@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Capture of the raw CAN frames of a node and offline replay.
+
+:class:`FrameCapture` is installed as the `frame_trace` hook of a :class:`xcomcan.node.StuCanPublicNode` and appends
+every frame received and sent to a binary file, received frames keep the timestamp given by the driver.
+:class:`ReplayDriver` implements the driver interface and feeds the received frames of a capture back through a node,
+as fast as possible or at the recorded pace.
+
+A capture file starts with the `CAPTURE_MAGIC` header followed by fixed size records of `CAPTURE_RECORD`:
+timestamp (float64), identifier (uint32), direction (uint8, 0 received and 1 sent), data length (uint8) and data
+padded to 8 bytes, all little-endian.
+"""
+
+import logging
+from struct import Struct
+from threading import Lock, Event
+from time import monotonic, sleep, time
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b'XCOMCAN\x01'
+"""
+Header of a capture file, the last byte is the format version
+"""
+
+CAPTURE_RECORD = Struct('<dIBB8s')
+"""
+Codec of a captured frame: timestamp, identifier, direction, data length and data
+"""
+
+DIRECTIONS = ('rx', 'tx')
+"""
+Direction of a captured frame indexed by its direction code
+"""
+
+
+class FrameCapture:
+    """
+    Class representing a capture file being written, usable as `StuCanPublicNode.frame_trace`
+
+    Attributes
+    ----------
+    path : string
+        Location of the capture file
+    frames : int
+        Number of frames written
+    """
+
+    def __init__(self, path, buffering=1 << 16):
+        """
+        Parameters
+        ----------
+        path : string
+            Location of the capture file, overwritten if it exists
+
+        buffering : int
+            Size in bytes of the write buffer, frames are flushed to the file when it is full and on close
+
+        Example
+        -------
+        .. code-block:: python
+
+            with StuCanPublicClient(0x00, CAN_BUS_SPEED, bustype='kvaser', capture_path='field.xcap') as client:
+                ...
+        """
+        self.path = path
+        self.lock = Lock()
+        self.file = open(path, 'wb', buffering=buffering)
+        self.file.write(CAPTURE_MAGIC)
+        self.frames = 0
+
+    def __call__(self, direction, identifier, data, timestamp):
+        """
+        Append a frame to the file, signature of the `frame_trace` hook
+
+        Parameters
+        ----------
+        direction : string
+            'rx' for a received frame, 'tx' for a sent frame
+
+        identifier : int
+            CAN frame id
+
+        data : bytes
+            CAN frame data
+
+        timestamp : float
+            Driver timestamp of a received frame, None for a sent frame which is then stamped with the current time
+        """
+        data = bytes(data)
+        record = CAPTURE_RECORD.pack(time() if timestamp is None else timestamp, identifier,
+                                     DIRECTIONS.index(direction), len(data), data)
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.write(record)
+            self.frames += 1
+
+    def flush(self):
+        """
+        Write the buffered frames to the file
+        """
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        """
+        Write the buffered frames and close the file, later frames are ignored
+        """
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_capture(path):
+    """
+    Read a capture file frame by frame
+
+    Parameters
+    ----------
+    path : string
+        Location of the capture file
+
+    Yields
+    ------
+    tuple
+        (timestamp, direction, identifier, data), direction being 'rx' or 'tx'
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError('{} is not a capture file'.format(path))
+        while True:
+            chunk = f.read(CAPTURE_RECORD.size * 4096)
+            # a capture interrupted while writing may end with a partial record
+            for timestamp, identifier, direction, dlc, data in CAPTURE_RECORD.iter_unpack(
+                    chunk[:len(chunk) - len(chunk) % CAPTURE_RECORD.size]):
+                yield timestamp, DIRECTIONS[direction], identifier, data[:dlc]
+            if len(chunk) < CAPTURE_RECORD.size * 4096:
+                return
+
+
+class ReplayDriver:
+    """
+    Class representing a driver playing back the received frames of a capture file, usable as driver of a
+    `StuCanPublicNode`. Frames sent by the node are counted and dropped
+
+    Attributes
+    ----------
+    finished : threading.Event
+        Set once every frame of the capture has been received
+    replayed : int
+        Number of frames handed to the node
+    sent : int
+        Number of frames sent by the node during the replay
+    """
+
+    def __init__(self, path, realtime=False, speed=1.0):
+        """
+        Parameters
+        ----------
+        path : string
+            Location of the capture file
+
+        realtime : boolean
+            Deliver the frames at the recorded pace instead of as fast as possible
+
+        speed : float
+            Pace factor of a realtime replay, e.g. 10 to replay ten times faster than recorded
+
+        Example
+        -------
+        .. code-block:: python
+
+            driver = ReplayDriver('field.xcap')
+            node = StuCanPublicNode(driver, 0x00, debug=True)
+            for service in (ReadUserInfoResponse, WriteParameterResponse, ReadParameterResponse, MessageNotification):
+                node.add_service(service)
+            node.start()
+            driver.finished.wait()
+            node.stop()
+            node.join()
+            print(node.messages())
+        """
+        assert speed > 0
+        self.frames = (frame for frame in read_capture(path) if frame[1] == 'rx')
+        self.realtime = realtime
+        self.speed = speed
+        self.finished = Event()
+        self.replayed = 0
+        self.sent = 0
+        self.origin = None
+        self.next_frame = None
+
+    def send(self, identifier, data, is_extended_id=False):
+        """
+        Driver interface, frames sent during a replay go nowhere
+        """
+        self.sent += 1
+
+    def receive(self, timeout=100):
+        """
+        Driver interface, retreive the next received frame of the capture
+
+        Parameters
+        ----------
+        timeout : float
+            milli seconds to wait for a frame (default 100ms)
+
+        Returns
+        -------
+        tuple
+            identifier, data, dlc, flag, timestamp, the recorded timestamp being preserved
+        """
+        if self.next_frame is None:
+            self.next_frame = next(self.frames, None)
+            if self.next_frame is None:
+                self.finished.set()
+                sleep(timeout / 1000)
+                return None, None, None, None, None
+        timestamp, direction, identifier, data = self.next_frame
+        if self.realtime:
+            if self.origin is None:
+                self.origin = (monotonic(), timestamp)
+            delay = self.origin[0] + (timestamp - self.origin[1]) / self.speed - monotonic()
+            if delay > timeout / 1000:
+                sleep(timeout / 1000)
+                return None, None, None, None, None
+            if delay > 0:
+                sleep(delay)
+        self.next_frame = None
+        self.replayed += 1
+        return identifier, data, len(data), None, timestamp
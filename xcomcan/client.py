@@ -22,11 +22,45 @@ installation, to write in RAM instead of flash using the "unsaved value" part.**
 """
 
 from stucancommon.driver import PythonCanDriver
-from .node import StuCanPublicNode
+from .node import StuCanPublicNode, StuCanPublicError
 from .node import ReadUserInfoRequest, ReadUserInfoResponse
 from .node import WriteParameterRequest, WriteParameterResponse
 from .node import ReadParameterRequest, ReadParameterResponse
 from .node import MessageNotification
+from .addresses import PARAMETER_PART_FLASH
+from .cache import USER_INFO, PARAMETER
+from .limits import ParameterLimitStore, LimitRevalidation, LIMIT_PARTS
+from .capture import FrameCapture
+from .writes import WriteCoalescer
+from .discovery import discover
+
+
+DEFAULT_TIMEOUT = 1
+"""
+Response timeout in seconds of the requests without explicit timeout, unless the client derives them from the
+round-trip times
+"""
+
+
+class ParameterTransactionError(Exception):
+    """
+    Class representing a failed Parameter transaction, raised once the previous values have been restored
+    """
+
+    def __init__(self, errors, rollback_errors):
+        """
+        errors : dict
+            StuCanPublicError or Timeout keyed by (address, parameter_id, part) of the reads or writes that failed
+
+        rollback_errors : dict
+            StuCanPublicError or Timeout keyed by (address, parameter_id, part) of the previous values that could not
+            be restored, empty when the rollback succeeded
+        """
+        self.errors = errors
+        self.rollback_errors = rollback_errors
+
+    def __str__(self):
+        return 'ParameterTransactionError(errors={}, rollback_errors={})'.format(self.errors, self.rollback_errors)
 
 
 class StuCanPublicClient:
@@ -34,7 +68,9 @@ class StuCanPublicClient:
     Class representing a StuCan public client
     """
 
-    def __init__(self, source_address, can_bus_speed=125000, bustype='kvaser', debug=False):
+    def __init__(self, source_address, can_bus_speed=125000, bustype='kvaser', debug=False, cache=None,
+                 limits_path=None, driver=None, capture_path=None, coalesce_writes=False, round_trip_times=None,
+                 retry=None, name=None):
         """
         Parameters
         ----------
@@ -46,6 +82,29 @@ class StuCanPublicClient:
             Name of the CAN interface used, refer to : `python-can <https://python-can.readthedocs.io/en/master/configuration.html#interface-names>`_
         debug : boolean
             Enable debug traces
+        cache : ReadCache
+            Optional cache of the values read, refer to :class:`xcomcan.cache.ReadCache`
+        limits_path : string
+            Optional file where Parameter min and max values are persisted, refer to
+            :class:`xcomcan.limits.ParameterLimitStore`
+        driver : object
+            Optional driver used instead of `PythonCanDriver`, e.g. a
+            :class:`xcomcan.simulator.SimulatedInstallation`
+        capture_path : string
+            Optional file where every frame received and sent is captured, refer to
+            :class:`xcomcan.capture.FrameCapture`
+        coalesce_writes : boolean
+            Drop the writes of a value already confirmed by the device and merge the concurrent writes of the same
+            Parameter, refer to :class:`xcomcan.writes.WriteCoalescer`
+        round_trip_times : RoundTripTimes
+            Optional estimator of the round-trip time to each device, when given the requests without explicit
+            timeout use a timeout derived from it instead of DEFAULT_TIMEOUT, refer to
+            :class:`xcomcan.node.RoundTripTimes`
+        retry : RetryPolicy
+            Optional policy retrying the requests which failed for a transient reason and hedging the reads, refer to
+            :class:`xcomcan.retry.RetryPolicy`
+        name : string
+            Name of the node logger below "xcomcan.node", default to the source address
 
         Example
         -------
@@ -62,6 +121,15 @@ class StuCanPublicClient:
         self.can_bus_speed = can_bus_speed
         self.bustype = bustype
         self.debug = debug
+        self.driver = driver
+        self.cache = cache
+        self.limits = ParameterLimitStore(limits_path) if limits_path is not None else None
+        self.capture_path = capture_path
+        self.capture = None
+        self.write_coalescer = WriteCoalescer(self._write_parameter) if coalesce_writes else None
+        self.round_trip_times = round_trip_times
+        self.name = name
+        self.retry = retry
 
     def __enter__(self):
         """
@@ -71,13 +139,21 @@ class StuCanPublicClient:
         Use the with statement to bind this method's return value to the target
         specified in the as clause of the statement.
         """
-        can_driver = PythonCanDriver(self.can_bus_speed, self.bustype)
-        self.node = StuCanPublicNode(can_driver, self.source_address, self.debug)
+        can_driver = self.driver if self.driver is not None else PythonCanDriver(self.can_bus_speed, self.bustype)
+        self.node = StuCanPublicNode(can_driver, self.source_address, self.debug,
+                                     round_trip_times=self.round_trip_times, name=self.name)
         self.node.add_service(ReadUserInfoResponse)
         self.node.add_service(WriteParameterResponse)
         self.node.add_service(ReadParameterResponse)
         self.node.add_service(MessageNotification)
+        if self.capture_path is not None:
+            self.capture = FrameCapture(self.capture_path)
+            self.node.frame_trace = self.capture
         self.node.start()
+        if self.limits is not None:
+            self.limits.load()
+            self.revalidation = LimitRevalidation(self, self.limits)
+            self.revalidation.start()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -86,10 +162,50 @@ class StuCanPublicClient:
 
         Exit the runtime context related to this object.
         """
+        if self.limits is not None:
+            self.revalidation.stop()
+            self.revalidation.join()
+            self.limits.save()
         self.node.stop()
         self.node.join()
+        if self.capture is not None:
+            self.capture.close()
 
-    def read_user_info(self, destination_address, info_id, timeout=1):
+    def request_timeout(self, destination_address, timeout=None):
+        """
+        Retreive the response timeout of a request
+
+        Parameters
+        ----------
+        destination_address : int
+            Targeted device address
+
+        timeout : float
+            Explicit timeout, returned as is when given
+
+        Returns
+        -------
+        float
+            Timeout in seconds, derived from the round-trip times to the device when the client was created with
+            `round_trip_times`, DEFAULT_TIMEOUT otherwise
+        """
+        if timeout is not None:
+            return timeout
+        if self.round_trip_times is not None:
+            return self.round_trip_times.timeout(destination_address)
+        return DEFAULT_TIMEOUT
+
+    def _wait_response(self, destination_address, request, timeout, idempotent):
+        timeout = self.request_timeout(destination_address, timeout)
+        if self.retry is None:
+            return self.node.wait_response(destination_address, request, timeout)
+        return self.retry.call(self.node, destination_address, request, timeout, idempotent)
+
+    def _timeouts(self, timeout):
+        # timeout of the batched requests, per address unless explicit
+        return timeout if timeout is not None else self.request_timeout
+
+    def read_user_info(self, destination_address, info_id, timeout=None):
         """
         Allow to read a Studer User Info from a targeted device
 
@@ -108,7 +224,7 @@ class StuCanPublicClient:
             User Info id number
 
         timeout : float
-            Response timeout, default to 1 second
+            Response timeout, default to the one given by :meth:`request_timeout`
 
         Returns
         -------
@@ -143,11 +259,18 @@ class StuCanPublicClient:
                     else:
                         print('user info:', result)
         """
+        key = (USER_INFO, destination_address, info_id)
+        if self.cache is not None:
+            hit, value = self.cache.get(key)
+            if hit:
+                return value
         request = ReadUserInfoRequest(info_id)
-        response = self.node.wait_response(destination_address, request, timeout)
+        response = self._wait_response(destination_address, request, timeout, True)
+        if self.cache is not None:
+            self.cache.put(key, response.value)
         return response.value
 
-    def write_parameter(self, destination_address, parameter_id, part, value, timeout=1):
+    def write_parameter(self, destination_address, parameter_id, part, value, timeout=None):
         """
         Allow to write a Studer Parameter on a targeted device
 
@@ -166,7 +289,7 @@ class StuCanPublicClient:
             The value to write
 
         timeout : float
-            Response timeout, default to 1 second
+            Response timeout, default to the one given by :meth:`request_timeout`
 
         Returns
         -------
@@ -205,11 +328,21 @@ class StuCanPublicClient:
                     else:
                         print('param write:', result)
         """
+        if self.write_coalescer is not None:
+            return self.write_coalescer.write(destination_address, parameter_id, part, value, timeout)
+        return self._write_parameter(destination_address, parameter_id, part, value, timeout)
+
+    def _write_parameter(self, destination_address, parameter_id, part, value, timeout):
         request = WriteParameterRequest(parameter_id, part, value)
-        response = self.node.wait_response(destination_address, request, timeout)
+        try:
+            response = self._wait_response(destination_address, request, timeout, False)
+        finally:
+            # even a failed or timed out write may have changed the value
+            if self.cache is not None:
+                self.cache.invalidate_parameter(destination_address, parameter_id)
         return response.parameter_id
 
-    def read_parameter(self, destination_address, parameter_id, part, timeout=1):
+    def read_parameter(self, destination_address, parameter_id, part, timeout=None):
         """
         Allow to read a Studer Parameter from a targeted device
 
@@ -225,7 +358,7 @@ class StuCanPublicClient:
             PARAMETER_PART_FLASH, PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX or PARAMETER_PART_RAM
 
         timeout : float
-            Response timeout, default to 1 second
+            Response timeout, default to the one given by :meth:`request_timeout`
 
         Returns
         -------
@@ -292,14 +425,378 @@ class StuCanPublicClient:
                     else:
                         print('param ram:', result)  # value stored in flash, ram reading not allowed
         """
+        if self.limits is not None and part in LIMIT_PARTS:
+            value = self.limits.get(destination_address, parameter_id, part)
+            if value is not None:
+                return value
+        key = (PARAMETER, destination_address, parameter_id, part)
+        if self.cache is not None:
+            hit, value = self.cache.get(key)
+            if hit:
+                return value
+            generation = self.cache.generation
         request = ReadParameterRequest(parameter_id, part)
-        response = self.node.wait_response(destination_address, request, timeout)
+        response = self._wait_response(destination_address, request, timeout, True)
+        if self.cache is not None:
+            self.cache.put(key, response.value, generation)
+        if self.limits is not None and part in LIMIT_PARTS:
+            self.limits.put(destination_address, parameter_id, part, response.value)
         return response.value
 
-    def messages(self):
+    def read_user_infos(self, items, timeout=None, window=8):
+        """
+        Allow to read many Studer User Infos in one call, requests are pipelined on the CAN bus
+
+        Parameters
+        ----------
+        items : list
+            List of (destination_address, info_id) tuples
+
+        timeout : float
+            Response timeout of each User Info, default to the one given by :meth:`request_timeout`
+
+        window : int
+            Maximum number of requests in flight at the same time, default to 8
+
+        Returns
+        -------
+        tuple
+            (values, errors) dictionaries keyed by (destination_address, info_id), values hold the User Info values
+            and errors the StuCanPublicError or Timeout raised for the items that failed
+
+        Example
+        -------
+        .. code-block:: python
+
+            values, errors = client.read_user_infos([(XT_1_DEVICE_ID, 3000), (XT_1_DEVICE_ID, 3001),
+                                                     (VT_1_DEVICE_ID, 11000)])
+        """
+        keys = [(USER_INFO, destination_address, info_id) for destination_address, info_id in items]
+        return self._read_many(keys, lambda key: ReadUserInfoRequest(key[2]), timeout, window)
+
+    def read_parameters(self, items, part, timeout=None, window=8):
+        """
+        Allow to read many Studer Parameters in one call, requests are pipelined on the CAN bus
+
+        Parameters
+        ----------
+        items : list
+            List of (destination_address, parameter_id) tuples
+
+        part : int
+            PARAMETER_PART_FLASH, PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX or PARAMETER_PART_RAM
+
+        timeout : float
+            Response timeout of each Parameter, default to the one given by :meth:`request_timeout`
+
+        window : int
+            Maximum number of requests in flight at the same time, default to 8
+
+        Returns
+        -------
+        tuple
+            (values, errors) dictionaries keyed by (destination_address, parameter_id), values hold the Parameter
+            values and errors the StuCanPublicError or Timeout raised for the items that failed
+        """
+        keys = [(PARAMETER, destination_address, parameter_id, part) for destination_address, parameter_id in items]
+        return self._read_many(keys, lambda key: ReadParameterRequest(key[2], part), timeout, window)
+
+    def read_user_info_group(self, group_address, info_id, quorum=None, timeout=1):
+        """
+        Allow to read a Studer User Info from every device of a multicast group with a single request frame
+
+        Parameters
+        ----------
+        group_address : int
+            XT_GROUP_DEVICE_ID, VT_GROUP_DEVICE_ID, BSP_GROUP_DEVICE_ID or VS_GROUP_DEVICE_ID
+
+        info_id : int
+            User Info id number
+
+        quorum : int
+            Number of devices expected to answer, return as soon as they did, default to wait for the whole timeout
+
+        timeout : float
+            Collecting time, default to 1 second
+
+        Returns
+        -------
+        tuple
+            (values, errors) dictionaries keyed by source address, values hold the User Info values and errors the
+            StuCanPublicError returned by the devices that failed
+
+        Example
+        -------
+        .. code-block:: python
+
+            # Battery voltage of every Xtender of an installation made of 9 Xtenders
+            values, errors = client.read_user_info_group(XT_GROUP_DEVICE_ID, 3000, quorum=9)
+        """
+        request = ReadUserInfoRequest(info_id)
+        return self._collect_group(self.node.wait_group_responses(group_address, request, timeout, quorum), 'value')
+
+    def read_parameter_group(self, group_address, parameter_id, part, quorum=None, timeout=1):
+        """
+        Allow to read a Studer Parameter from every device of a multicast group with a single request frame
+
+        Parameters
+        ----------
+        group_address : int
+            XT_GROUP_DEVICE_ID, VT_GROUP_DEVICE_ID, BSP_GROUP_DEVICE_ID or VS_GROUP_DEVICE_ID
+
+        parameter_id : int
+            Paramter id number
+
+        part : int
+            PARAMETER_PART_FLASH, PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX or PARAMETER_PART_RAM
+
+        quorum : int
+            Number of devices expected to answer, return as soon as they did, default to wait for the whole timeout
+
+        timeout : float
+            Collecting time, default to 1 second
+
+        Returns
+        -------
+        tuple
+            (values, errors) dictionaries keyed by source address, values hold the Parameter values and errors the
+            StuCanPublicError returned by the devices that failed
+        """
+        request = ReadParameterRequest(parameter_id, part)
+        return self._collect_group(self.node.wait_group_responses(group_address, request, timeout, quorum), 'value')
+
+    def write_parameter_group(self, group_address, parameter_id, part, value, quorum=None, timeout=1):
+        """
+        Allow to write a Studer Parameter on every device of a multicast group with a single request frame
+
+        Parameters
+        ----------
+        group_address : int
+            XT_GROUP_DEVICE_ID, VT_GROUP_DEVICE_ID, BSP_GROUP_DEVICE_ID or VS_GROUP_DEVICE_ID
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH or PARAMETER_PART_RAM
+
+        value : int
+            The value to write
+
+        quorum : int
+            Number of devices expected to answer, return as soon as they did, default to wait for the whole timeout
+
+        timeout : float
+            Collecting time, default to 1 second
+
+        Returns
+        -------
+        tuple
+            (written, errors) dictionaries keyed by source address, written holds the Parameter identifier that has
+            been written and errors the StuCanPublicError returned by the devices that failed
+        """
+        request = WriteParameterRequest(parameter_id, part, value)
+        try:
+            responses = self.node.wait_group_responses(group_address, request, timeout, quorum)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate_parameter(group_address, parameter_id)
+            if self.write_coalescer is not None:
+                self.write_coalescer.forget(group_address, parameter_id)
+        return self._collect_group(responses, 'parameter_id')
+
+    def write_parameter_transaction(self, items, timeout=None, window=32):
+        """
+        Allow to write many Studer Parameters as a whole, on several devices. The previous values are read first,
+        then every value is written in parallel. When any write fails the Parameters already written, or whose write
+        timed out, are restored to their previous value
+
+        Note
+        -----
+        Only `PARAMETER_PART_FLASH` can be written in a transaction: reading `PARAMETER_PART_RAM` returns the flash
+        value, the previous RAM value is unknown and could not be restored. Writing the flash also changes the RAM
+        value, a rollback restores the previous flash value in both
+
+        Parameters
+        ----------
+        items : list
+            List of (destination_address, parameter_id, part, value) tuples, part is PARAMETER_PART_FLASH and each
+            Parameter of a device is written at most once
+
+        timeout : float
+            Response timeout of each read and write, default to the one given by :meth:`request_timeout`
+
+        window : int
+            Maximum number of requests in flight at the same time, default to 32
+
+        Returns
+        -------
+        dict
+            Previous values keyed by (destination_address, parameter_id, part)
+
+        Raises
+        ------
+        ValueError
+            When an item is not a flash write or a Parameter of a device is written more than once
+
+        ParameterTransactionError
+            When a previous value could not be read (nothing has been written) or a write failed (the previous values
+            have been restored, except the ones listed in `rollback_errors`)
+
+        Example
+        -------
+        .. code-block:: python
+
+            # same battery charge current on 9 Xtenders and 15 VarioTracks
+            items = [(XT_GROUP_DEVICE_ID + index, 1138, PARAMETER_PART_FLASH, 30.0) for index in range(1, 10)]
+            items += [(VT_GROUP_DEVICE_ID + index, 10002, PARAMETER_PART_FLASH, 40.0) for index in range(1, 16)]
+            try:
+                client.write_parameter_transaction(items)
+            except ParameterTransactionError as e:
+                print(e)
+        """
+        keys = [(destination_address, parameter_id, part) for destination_address, parameter_id, part, value in items]
+        if any(part != PARAMETER_PART_FLASH for address, parameter_id, part in keys):
+            raise ValueError('only PARAMETER_PART_FLASH can be written in a transaction, the previous RAM value can '
+                             'not be read back')
+        if len({key[:2] for key in keys}) != len(keys):
+            raise ValueError('a Parameter is written more than once')
+        reads = self.node.wait_responses([(address, ReadParameterRequest(parameter_id, part))
+                                          for address, parameter_id, part in keys], self._timeouts(timeout), window)
+        errors = {key: result for key, result in zip(keys, reads) if isinstance(result, Exception)}
+        if errors:
+            raise ParameterTransactionError(errors, {})
+        previous = {key: result.value for key, result in zip(keys, reads)}
+        writes = self._write_many([tuple(item) for item in items], timeout, window)
+        errors = {key: result for key, result in zip(keys, writes) if isinstance(result, Exception)}
+        if not errors:
+            return previous
+        # a timed out write may have been applied, it is restored as well
+        restore = [key for key, result in zip(keys, writes) if not isinstance(result, StuCanPublicError)]
+        results = self._write_many([key + (previous[key],) for key in restore], timeout, window)
+        rollback_errors = {key: result for key, result in zip(restore, results) if isinstance(result, Exception)}
+        raise ParameterTransactionError(errors, rollback_errors)
+
+    def _write_many(self, items, timeout, window):
+        requests = [(address, WriteParameterRequest(parameter_id, part, value))
+                    for address, parameter_id, part, value in items]
+        try:
+            return self.node.wait_responses(requests, self._timeouts(timeout), window)
+        finally:
+            for address, parameter_id, part, value in items:
+                if self.cache is not None:
+                    self.cache.invalidate_parameter(address, parameter_id)
+                if self.write_coalescer is not None:
+                    self.write_coalescer.forget(address, parameter_id)
+
+    @staticmethod
+    def _collect_group(responses, attribute):
+        values = {}
+        errors = {}
+        for source_address, response in responses.items():
+            if isinstance(response, Exception):
+                errors[source_address] = response
+            else:
+                values[source_address] = getattr(response, attribute)
+        return values, errors
+
+    def _read_many(self, keys, make_request, timeout, window):
+        values = {}
+        errors = {}
+        missing = []
+        for key in keys:
+            hit, value = self.cache.get(key) if self.cache is not None else (False, None)
+            if not hit and self.limits is not None and key[0] == PARAMETER and key[3] in LIMIT_PARTS:
+                value = self.limits.get(*key[1:])
+                hit = value is not None
+            if hit:
+                values[key[1:3]] = value
+            else:
+                missing.append(key)
+        generation = self.cache.generation if self.cache is not None else None
+        requests = [(key[1], make_request(key)) for key in missing]
+        if self.retry is not None:
+            results = self.retry.wait_responses(self.node, requests, self._timeouts(timeout), window)
+        else:
+            results = self.node.wait_responses(requests, self._timeouts(timeout), window)
+        for key, result in zip(missing, results):
+            if isinstance(result, Exception):
+                errors[key[1:3]] = result
+            else:
+                values[key[1:3]] = result.value
+                if self.cache is not None:
+                    self.cache.put(key, result.value, generation if key[0] == PARAMETER else None)
+                if self.limits is not None and key[0] == PARAMETER and key[3] in LIMIT_PARTS:
+                    self.limits.put(*key[1:], result.value)
+        return values, errors
+
+    def discover(self, cache_path=None, timeout=0.2, refresh=False):
+        """
+        Allow to find the devices of the installation, every address is probed at the same time
+
+        Parameters
+        ----------
+        cache_path : string
+            Optional file where the topology is saved, later calls only verify the saved devices
+
+        timeout : float
+            Response timeout of each probe, default to 0.2 second
+
+        refresh : boolean
+            Probe every address even if the saved topology is still valid
+
+        Returns
+        -------
+        InstallationTopology
+            Devices found, refer to :class:`xcomcan.discovery.InstallationTopology`
+
+        Example
+        -------
+        .. code-block:: python
+
+            topology = client.discover('topology.json')
+            values, errors = client.read_user_infos([(address, 3000) for address in topology.xtenders])
+        """
+        return discover(self.node, cache_path, timeout, refresh)
+
+    def stream_messages(self, since=None, timeout=None):
+        """
+        Allow to iterate over the messages as soon as they happen on the CAN bus, instead of polling
+        :meth:`messages`
+
+        Parameters
+        ----------
+        since : int
+            Sequence number of the last message already seen, default to only yield messages received from now on
+
+        timeout : float
+            Stop the iteration when no message arrives within this time in seconds, None to iterate until the client
+            exits
+
+        Yields
+        ------
+        tuple
+            (source_address, message)
+
+        Example
+        -------
+        .. code-block:: python
+
+            for source_address, message in client.stream_messages():
+                print('message', message.message_id, 'from', source_address)
+        """
+        return self.node.stream_messages(since, timeout)
+
+    def messages(self, since=None):
         """
         Allow to retreive the list of messages previously happened on the CAN bus
 
+        Parameters
+        ----------
+        since : int
+            Sequence number of the last message already seen, when given only newer messages are returned as
+            (sequence, source_address, message) tuples
+
         Returns
         -------
         list
@@ -332,4 +829,4 @@ class StuCanPublicClient:
                     else:
                         print('messages:', msgs)
         """
-        return self.node.messages()
+        return self.node.messages(since)
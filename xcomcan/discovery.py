@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Discovery of the devices of an installation.
+
+Every unicast address of :mod:`xcomcan.addresses` is probed at the same time with a short timeout by reading a User
+Info every device of its kind has. Any response, even an error other than DEVICE_NOT_FOUND, tells the device exists.
+The resulting :class:`InstallationTopology` can be saved to a local file, the next starts then only verify the known
+devices instead of probing the whole address range.
+"""
+
+import json
+import logging
+import os
+import random
+from time import sleep, time
+from stucancommon.node import Timeout
+from .addresses import XT_1_DEVICE_ID, XT_9_DEVICE_ID, VT_1_DEVICE_ID, VT_15_DEVICE_ID
+from .addresses import VS_1_DEVICE_ID, VS_15_DEVICE_ID, BSP_DEVICE_ID
+from .addresses import XT_GROUP_DEVICE_ID, VT_GROUP_DEVICE_ID, VS_GROUP_DEVICE_ID, BSP_GROUP_DEVICE_ID
+from .node import CONGESTION_ERROR_CODES, ReadUserInfoRequest, StuCanPublicError, group_of
+
+logger = logging.getLogger(__name__)
+
+PROBE_ADDRESSES = tuple(range(XT_1_DEVICE_ID, XT_9_DEVICE_ID + 1)) + \
+    tuple(range(VT_1_DEVICE_ID, VT_15_DEVICE_ID + 1)) + \
+    tuple(range(VS_1_DEVICE_ID, VS_15_DEVICE_ID + 1)) + (BSP_DEVICE_ID,)
+"""
+Unicast addresses probed by a full discovery
+"""
+
+PROBE_USER_INFOS = {
+    XT_GROUP_DEVICE_ID: 3000,
+    VT_GROUP_DEVICE_ID: 11000,
+    VS_GROUP_DEVICE_ID: 15000,
+    BSP_GROUP_DEVICE_ID: 7000,
+}
+"""
+User Info read to probe a device keyed by group address, the battery voltage measured by every device
+"""
+
+DEVICE_NOT_FOUND = 0x02
+
+BUSY_PROBES = 8
+"""
+Number of times an address answered RESPONSE_TIMEOUT or GATEWAY_BUSY is probed again, the gateway may not keep up
+with every probe sent at once
+"""
+
+REPROBE_BACKOFF = 0.02
+"""
+Upper bound in seconds of the random delay before the first round of probes sent again, doubled at each round up to
+0.5 s, the window of the probes is halved at each round
+"""
+
+
+class InstallationTopology:
+    """
+    Class representing the devices found in an installation
+
+    Attributes
+    ----------
+    addresses : tuple
+        Sorted unicast addresses of the devices
+    discovered : float
+        POSIX timestamp of the discovery
+    """
+
+    FORMAT_VERSION = 1
+    """
+    const int :
+        Version of the file format, files of another version are ignored
+    """
+
+    def __init__(self, addresses, discovered=None):
+        """
+        Parameters
+        ----------
+        addresses : iterable
+            Unicast addresses of the devices
+
+        discovered : float
+            POSIX timestamp of the discovery, default to now
+        """
+        self.addresses = tuple(sorted(set(addresses)))
+        self.discovered = time() if discovered is None else discovered
+
+    def __repr__(self):
+        return 'InstallationTopology{}'.format(self.addresses)
+
+    def __eq__(self, other):
+        return isinstance(other, InstallationTopology) and self.addresses == other.addresses
+
+    def __contains__(self, address):
+        return address in self.addresses
+
+    def __iter__(self):
+        return iter(self.addresses)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def group(self, group_address):
+        """
+        Parameters
+        ----------
+        group_address : int
+            XT_GROUP_DEVICE_ID, VT_GROUP_DEVICE_ID, BSP_GROUP_DEVICE_ID or VS_GROUP_DEVICE_ID
+
+        Returns
+        -------
+        tuple
+            Addresses of the devices of the group
+        """
+        return tuple(address for address in self.addresses if group_of(address) == group_address)
+
+    @property
+    def xtenders(self):
+        """
+        Addresses of the Xtenders found
+        """
+        return self.group(XT_GROUP_DEVICE_ID)
+
+    @property
+    def variotracks(self):
+        """
+        Addresses of the VarioTracks found
+        """
+        return self.group(VT_GROUP_DEVICE_ID)
+
+    @property
+    def variostrings(self):
+        """
+        Addresses of the VarioStrings found
+        """
+        return self.group(VS_GROUP_DEVICE_ID)
+
+    @property
+    def bsp(self):
+        """
+        Addresses of the BSP found
+        """
+        return self.group(BSP_GROUP_DEVICE_ID)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a topology saved to a file
+
+        Parameters
+        ----------
+        path : string
+            Location of the JSON file
+
+        Returns
+        -------
+        InstallationTopology
+            Saved topology, None when the file is missing or unreadable
+        """
+        try:
+            with open(path, encoding='utf-8') as f:
+                content = json.load(f)
+            if content.get('version') != cls.FORMAT_VERSION:
+                raise ValueError('unsupported version {}'.format(content.get('version')))
+            return cls((int(address) for address in content['addresses']), float(content['discovered']))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as exception:
+            logger.warning('ignoring topology file %s: %r', path, exception)
+            return None
+
+    def save(self, path):
+        """
+        Write the topology to a file, the file is replaced atomically
+
+        Parameters
+        ----------
+        path : string
+            Location of the JSON file
+        """
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.FORMAT_VERSION, 'discovered': self.discovered,
+                       'addresses': list(self.addresses)}, f)
+        os.replace(temporary_path, path)
+
+
+def probe(node, addresses, timeout=0.2, attempts=2, window=64):
+    """
+    Probe addresses concurrently, the probes are sent outside of the congestion window as most addresses are not
+    expected to answer
+
+    Parameters
+    ----------
+    node : StuCanPublicNode
+        Running node
+
+    addresses : iterable
+        Unicast addresses to probe, each must belong to a group of PROBE_USER_INFOS
+
+    timeout : float
+        Response timeout of each probe in seconds
+
+    attempts : int
+        Number of probes sent to an address that does not answer at all, a lost frame does not hide a device. An
+        address answered RESPONSE_TIMEOUT or GATEWAY_BUSY is probed again up to BUSY_PROBES more times
+
+    window : int
+        Maximum number of probes in flight at the same time during the first round, halved at each round of probes
+        sent again
+
+    Returns
+    -------
+    set
+        Addresses of the devices that answered
+    """
+    found = set()
+    remaining = list(addresses)
+    timeouts = dict.fromkeys(remaining, 0)
+    busy = dict.fromkeys(remaining, 0)
+    rounds = 0
+    while remaining:
+        if rounds > 0:
+            # leave a busy gateway some time and send the probes again a few at a time
+            sleep(random.uniform(0, min(0.5, REPROBE_BACKOFF * 2 ** (rounds - 1))))
+            window = max(1, window // 2)
+        rounds += 1
+        requests = [(address, ReadUserInfoRequest(PROBE_USER_INFOS[group_of(address)])) for address in remaining]
+        unanswered = []
+        for address, result in zip(remaining, node.wait_responses(requests, timeout, window, probe=True)):
+            if isinstance(result, Timeout):
+                timeouts[address] += 1
+                if timeouts[address] < attempts:
+                    unanswered.append(address)
+            elif isinstance(result, StuCanPublicError) and result.error_code in CONGESTION_ERROR_CODES:
+                busy[address] += 1
+                if busy[address] <= BUSY_PROBES:
+                    unanswered.append(address)
+            elif not isinstance(result, StuCanPublicError) or result.error_code != DEVICE_NOT_FOUND:
+                found.add(address)
+        remaining = unanswered
+    return found
+
+
+def discover(node, cache_path=None, timeout=0.2, refresh=False):
+    """
+    Find the devices of the installation
+
+    Parameters
+    ----------
+    node : StuCanPublicNode
+        Running node
+
+    cache_path : string
+        Optional file where the topology is saved. When it holds a topology whose devices all still answer, it is
+        returned without probing the other addresses
+
+    timeout : float
+        Response timeout of each probe in seconds
+
+    refresh : boolean
+        Probe every address even if a saved topology is still valid, e.g. after adding a device
+
+    Returns
+    -------
+    InstallationTopology
+        Devices found
+    """
+    if cache_path is not None and not refresh:
+        cached = InstallationTopology.load(cache_path)
+        if cached is not None and len(cached) > 0:
+            if probe(node, cached.addresses, timeout) == set(cached.addresses):
+                return cached
+            logger.info('saved topology %s changed, probing every address', cached)
+    topology = InstallationTopology(probe(node, PROBE_ADDRESSES, timeout))
+    if cache_path is not None:
+        topology.save(cache_path)
+    return topology
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Persistent store of Parameter limits.
+
+Minimum and maximum values of the Parameters (`PARAMETER_PART_FLASH_MIN` and `PARAMETER_PART_FLASH_MAX`) almost
+never change. They are saved to a local JSON file keyed by device address so that a restarted client can validate
+setpoints right away, the stored limits being revalidated in the background.
+"""
+
+import json
+import logging
+import os
+from threading import Thread, Lock
+from stucancommon.node import Timeout
+from .addresses import PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX
+from .node import CONGESTION_ERROR_CODES, ReadParameterRequest, StuCanPublicError
+
+logger = logging.getLogger(__name__)
+
+LIMIT_PARTS = (PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX)
+"""
+Parameter parts held by the store
+"""
+
+
+class ParameterLimitStore:
+    """
+    Class representing Parameter limits persisted to a local file
+
+    Attributes
+    ----------
+    path : string
+        Location of the JSON file
+    limits : dict
+        Limit value keyed by (address, parameter_id, part)
+    """
+
+    FORMAT_VERSION = 1
+    """
+    const int :
+        Version of the file format, files of another version are ignored
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : string
+            Location of the JSON file, created on first save
+        """
+        self.path = path
+        self.limits = {}
+        self.lock = Lock()
+        self.dirty = False
+
+    def get(self, address, parameter_id, part):
+        """
+        Parameters
+        ----------
+        address : int
+            Device address
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH_MIN or PARAMETER_PART_FLASH_MAX
+
+        Returns
+        -------
+        float
+            Stored limit, None if unknown
+        """
+        with self.lock:
+            return self.limits.get((address, parameter_id, part))
+
+    def put(self, address, parameter_id, part, value):
+        """
+        Store a limit read from a device
+
+        Parameters
+        ----------
+        address : int
+            Device address
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH_MIN or PARAMETER_PART_FLASH_MAX
+
+        value : float
+            Limit value
+        """
+        assert part in LIMIT_PARTS
+        with self.lock:
+            key = (address, parameter_id, part)
+            if self.limits.get(key) != value:
+                self.limits[key] = value
+                self.dirty = True
+
+    def remove(self, address, parameter_id, part):
+        """
+        Forget a limit, e.g. the device no longer knows the Parameter
+
+        Parameters
+        ----------
+        address : int
+            Device address
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH_MIN or PARAMETER_PART_FLASH_MAX
+        """
+        with self.lock:
+            if self.limits.pop((address, parameter_id, part), None) is not None:
+                self.dirty = True
+
+    def keys(self):
+        """
+        Returns
+        -------
+        list
+            (address, parameter_id, part) of every stored limit
+        """
+        with self.lock:
+            return list(self.limits)
+
+    def load(self):
+        """
+        Read the limits from the file, a missing or unreadable file leaves the store empty
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                content = json.load(f)
+            if content.get('version') != self.FORMAT_VERSION:
+                raise ValueError('unsupported version {}'.format(content.get('version')))
+            limits = {(int(address), int(parameter_id), int(part)): float(value)
+                      for address, parameters in content['devices'].items()
+                      for parameter_id, parts in parameters.items()
+                      for part, value in parts.items()}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, AttributeError) as exception:
+            logger.warning('ignoring parameter limits file %s: %r', self.path, exception)
+            return
+        with self.lock:
+            self.limits = limits
+            self.dirty = False
+
+    def save(self):
+        """
+        Write the limits to the file if they changed, the file is replaced atomically
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            devices = {}
+            for (address, parameter_id, part), value in self.limits.items():
+                devices.setdefault(str(address), {}).setdefault(str(parameter_id), {})[str(part)] = value
+            self.dirty = False
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.FORMAT_VERSION, 'devices': devices}, f, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+
+class LimitRevalidation(Thread):
+    """
+    Thread re-reading every stored limit on the CAN bus at low priority and updating the store. The reads are sent
+    outside of the congestion window and their timeouts are not congestion signals, a device that disappeared does not
+    slow down the requests of the application. The limits answered with an error are removed from the store
+    """
+
+    def __init__(self, client, store, window=2, timeout=None):
+        """
+        Parameters
+        ----------
+        client : StuCanPublicClient
+            Client already entered with the with statement
+
+        store : ParameterLimitStore
+            Store to revalidate
+
+        window : int
+            Maximum number of requests in flight at the same time, kept low to leave the bus to the application
+
+        timeout : float
+            Response timeout of each read, default to the one given by the client `request_timeout`
+        """
+        Thread.__init__(self, daemon=True)
+        self.client = client
+        self.store = store
+        self.window = window
+        self.timeout = timeout
+        self.isRunning = True
+
+    def stop(self):
+        """
+        Set LimitRevalidation.isRunning to False, the thread ends once the requests in flight are answered or timed
+        out, within one timeout
+        """
+        self.isRunning = False
+
+    def run(self):
+        """
+        Override method from Thread to re-read the stored limits one device and part at a time, `window` requests
+        at a time so that stop() is honoured quickly. A device that answers none of them is skipped
+        """
+        batches = {}
+        for address, parameter_id, part in self.store.keys():
+            batches.setdefault((address, part), []).append(parameter_id)
+        for (address, part), parameter_ids in sorted(batches.items()):
+            failures = 0
+            for start in range(0, len(parameter_ids), self.window):
+                if not self.isRunning:
+                    return
+                chunk = parameter_ids[start:start + self.window]
+                requests = [(address, ReadParameterRequest(parameter_id, part)) for parameter_id in chunk]
+                results = self.client.node.wait_responses(requests, self.client.request_timeout(address, self.timeout),
+                                                          self.window, probe=True)
+                for parameter_id, result in zip(chunk, results):
+                    if isinstance(result, StuCanPublicError) and result.error_code not in CONGESTION_ERROR_CODES:
+                        # the device answered, the stored limit is no longer valid
+                        self.store.remove(address, parameter_id, part)
+                        failures += 1
+                    elif isinstance(result, Exception):
+                        failures += 1
+                    else:
+                        self.store.put(address, parameter_id, part, result.value)
+                if all(isinstance(result, Timeout) for result in results):
+                    # the device is gone, do not wait for every one of its limits
+                    failures += len(parameter_ids) - start - len(chunk)
+                    break
+            if failures:
+                logger.info('%d parameter limits of address %d could not be revalidated', failures, address)
+        self.store.save()
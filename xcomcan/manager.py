@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Several installations driven from one process.
+
+:class:`InstallationManager` owns one :class:`xcomcan.client.StuCanPublicClient` per site, each on its own CAN
+interface with its own receiving thread, bitrate and address space. Devices are addressed by (site, device address)
+and the batch operations are split by site and run on every bus at the same time, so the time of a sweep over all
+the installations is the one of the slowest bus.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import can
+from stucancommon.driver import PythonCanDriver
+from .client import StuCanPublicClient
+
+
+class ChannelCanDriver(PythonCanDriver):
+    """
+    Class representing a `PythonCanDriver` opened on an explicit python-can channel, e.g. 'can0' and 'can1' of a
+    SocketCAN host or the channel numbers of a multi-channel Kvaser interface
+    """
+
+    def __init__(self, bitrate, interface='socketcan', channel=0):
+        """
+        Parameters
+        ----------
+        bitrate : int
+            CAN bus speed
+
+        interface : string
+            Name of the CAN interface, refer to : `python-can`
+
+        channel : int or string
+            Channel of the CAN interface
+        """
+        self.can_bus = can.interface.Bus(interface=interface, channel=channel, bitrate=bitrate)
+
+    def shutdown(self):
+        """
+        Release the CAN interface channel
+        """
+        self.can_bus.shutdown()
+
+
+class InstallationManager:
+    """
+    Class representing a set of installations, each one reached through its own CAN bus
+
+    Attributes
+    ----------
+    clients : dict
+        StuCanPublicClient keyed by site name, available within the with statement
+    """
+
+    def __init__(self, sites):
+        """
+        Parameters
+        ----------
+        sites : dict
+            Keyword arguments of the StuCanPublicClient of each site keyed by site name. A `channel` argument opens
+            the bus with :class:`ChannelCanDriver`, shut down on exit. The node logger of each site is named after
+            the site ("xcomcan.node.<site>") unless a `name` argument is given, so that `debug` traces only that site
+
+        Example
+        -------
+        .. code-block:: python
+
+            sites = {
+                'north': {'source_address': 0x00, 'can_bus_speed': 250000, 'bustype': 'socketcan', 'channel': 'can0'},
+                'south': {'source_address': 0x00, 'can_bus_speed': 125000, 'bustype': 'socketcan', 'channel': 'can1'},
+            }
+            with InstallationManager(sites) as manager:
+                print(manager.read_user_info(('north', XT_1_DEVICE_ID), 3000))
+                values, errors = manager.read_user_infos([(site, XT_1_DEVICE_ID, 3000) for site in sites])
+        """
+        assert sites
+        self.sites = {site: dict(arguments) for site, arguments in sites.items()}
+        self.clients = {}
+        self.drivers = []
+        self.executor = None
+
+    def __enter__(self):
+        """
+        Open the CAN bus of every site and start their nodes
+        """
+        try:
+            for site, arguments in self.sites.items():
+                arguments = dict(arguments)
+                channel = arguments.pop('channel', None)
+                arguments.setdefault('name', str(site))
+                if channel is not None and arguments.get('driver') is None:
+                    driver = ChannelCanDriver(arguments.get('can_bus_speed', 125000),
+                                              arguments.get('bustype', 'socketcan'), channel)
+                    self.drivers.append(driver)
+                    arguments['driver'] = driver
+                client = StuCanPublicClient(**arguments)
+                self.clients[site] = client.__enter__()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        self.executor = ThreadPoolExecutor(max_workers=len(self.clients), thread_name_prefix='xcomcan-manager')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Stop the node of every site and shut down the CAN interfaces opened by the manager
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        clients, self.clients = self.clients, {}
+        drivers, self.drivers = self.drivers, []
+        try:
+            for client in clients.values():
+                client.__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            for driver in drivers:
+                driver.shutdown()
+
+    def client(self, site):
+        """
+        Parameters
+        ----------
+        site : string
+            Site name
+
+        Returns
+        -------
+        StuCanPublicClient
+            Client of the site, for the operations the manager does not expose
+        """
+        return self.clients[site]
+
+    def read_user_info(self, device, info_id, timeout=None):
+        """
+        Allow to read a Studer User Info from a device of a site
+
+        Parameters
+        ----------
+        device : tuple
+            (site, device address)
+
+        info_id : int
+            User Info id number
+
+        timeout : float
+            Response timeout, default to the one of the site client
+
+        Returns
+        -------
+        float
+            User Info value
+        """
+        site, address = device
+        return self.clients[site].read_user_info(address, info_id, timeout)
+
+    def read_parameter(self, device, parameter_id, part, timeout=None):
+        """
+        Allow to read a Studer Parameter from a device of a site
+
+        Parameters
+        ----------
+        device : tuple
+            (site, device address)
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH, PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX or PARAMETER_PART_RAM
+
+        timeout : float
+            Response timeout, default to the one of the site client
+
+        Returns
+        -------
+        float
+            Parameter value
+        """
+        site, address = device
+        return self.clients[site].read_parameter(address, parameter_id, part, timeout)
+
+    def write_parameter(self, device, parameter_id, part, value, timeout=None):
+        """
+        Allow to write a Studer Parameter on a device of a site
+
+        Parameters
+        ----------
+        device : tuple
+            (site, device address)
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH or PARAMETER_PART_RAM
+
+        value : float
+            The value to write
+
+        timeout : float
+            Response timeout, default to the one of the site client
+
+        Returns
+        -------
+        int
+            Parameter identifier that has been written
+        """
+        site, address = device
+        return self.clients[site].write_parameter(address, parameter_id, part, value, timeout)
+
+    def read_user_infos(self, items, timeout=None, window=8):
+        """
+        Allow to read many Studer User Infos of several sites, every bus is read at the same time
+
+        Parameters
+        ----------
+        items : list
+            List of (site, device address, info_id) tuples
+
+        timeout : float
+            Response timeout of each User Info, default to the one of the site clients
+
+        window : int
+            Maximum number of requests in flight at the same time on each bus
+
+        Returns
+        -------
+        tuple
+            (values, errors) dictionaries keyed by (site, device address, info_id)
+        """
+        return self._fan_out(items, lambda client, site_items: client.read_user_infos(site_items, timeout, window))
+
+    def read_parameters(self, items, part, timeout=None, window=8):
+        """
+        Allow to read many Studer Parameters of several sites, every bus is read at the same time
+
+        Parameters
+        ----------
+        items : list
+            List of (site, device address, parameter_id) tuples
+
+        part : int
+            PARAMETER_PART_FLASH, PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX or PARAMETER_PART_RAM
+
+        timeout : float
+            Response timeout of each Parameter, default to the one of the site clients
+
+        window : int
+            Maximum number of requests in flight at the same time on each bus
+
+        Returns
+        -------
+        tuple
+            (values, errors) dictionaries keyed by (site, device address, parameter_id)
+        """
+        return self._fan_out(items,
+                             lambda client, site_items: client.read_parameters(site_items, part, timeout, window))
+
+    def discover(self, cache_paths=None, timeout=0.2, refresh=False):
+        """
+        Allow to find the devices of every site, the sites are probed at the same time
+
+        Parameters
+        ----------
+        cache_paths : dict
+            Optional file where the topology is saved keyed by site name, refer to
+            :meth:`xcomcan.client.StuCanPublicClient.discover`
+
+        timeout : float
+            Response timeout of each probe
+
+        refresh : boolean
+            Probe every address even if the saved topology is still valid
+
+        Returns
+        -------
+        dict
+            InstallationTopology keyed by site name
+        """
+        futures = {site: self.executor.submit(client.discover, (cache_paths or {}).get(site), timeout, refresh)
+                   for site, client in self.clients.items()}
+        return {site: future.result() for site, future in futures.items()}
+
+    def _fan_out(self, items, operation):
+        by_site = {}
+        for site, address, object_id in items:
+            by_site.setdefault(site, []).append((address, object_id))
+        futures = {site: self.executor.submit(operation, self.clients[site], site_items)
+                   for site, site_items in by_site.items()}
+        values = {}
+        errors = {}
+        for site, future in futures.items():
+            site_values, site_errors = future.result()
+            values.update({(site,) + key: value for key, value in site_values.items()})
+            errors.update({(site,) + key: error for key, error in site_errors.items()})
+        return values, errors
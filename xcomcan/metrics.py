@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Request metrics of a StuCan public node.
+
+Every :class:`xcomcan.node.StuCanPublicNode` counts the requests sent, the error identifiers and the timeouts and
+keeps a histogram of the response times, keyed by service id and device address. They can be read with
+:meth:`NodeMetrics.snapshot` or exported in the Prometheus text format with :meth:`NodeMetrics.prometheus`.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+"""
+Upper bounds in seconds of the response time histogram buckets, a last bucket holds the slower responses
+"""
+
+SERVICE_NAMES = {
+    0x0: 'read_user_info',
+    0x1: 'read_parameter',
+    0x2: 'write_parameter',
+    0x3: 'message_notification',
+}
+"""
+Service label of the exported metrics keyed by service identifier
+"""
+
+
+class NodeMetrics:
+    """
+    Class representing the counters and response time histograms of a node
+
+    Attributes
+    ----------
+    requests : dict
+        Number of requests sent keyed by (service_id, address)
+    errors : dict
+        Number of errors received keyed by (service_id, address, identifier), identifier being the name of the error
+        code, e.g. 'GATEWAY_BUSY'
+    timeouts : dict
+        Number of requests abandoned without response keyed by (service_id, address)
+    unexpected : int
+        Number of responses matching no pending request, usually received after their timeout
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Parameters
+        ----------
+        buckets : tuple
+            Increasing upper bounds in seconds of the response time histogram buckets
+        """
+        assert list(buckets) == sorted(buckets)
+        self.buckets = tuple(buckets)
+        self.lock = Lock()
+        self.requests = {}
+        self.errors = {}
+        self.timeouts = {}
+        self.latencies = {}
+        self.unexpected = 0
+
+    def request_sent(self, service_id, address):
+        """
+        Count a request frame sent
+
+        Parameters
+        ----------
+        service_id : int
+            StuCan2 service identifier
+
+        address : int
+            Targeted device or group address
+        """
+        key = (service_id, address)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def response_received(self, service_id, address, latency, identifier=None):
+        """
+        Record the response time of a request and count its error
+
+        Parameters
+        ----------
+        service_id : int
+            StuCan2 service identifier
+
+        address : int
+            Targeted device or group address
+
+        latency : float
+            Seconds elapsed between the transmission of the request and its response
+
+        identifier : string
+            Error identifier when the response is an error, None otherwise
+        """
+        key = (service_id, address)
+        index = bisect_left(self.buckets, latency)
+        with self.lock:
+            histogram = self.latencies.get(key)
+            if histogram is None:
+                histogram = self.latencies[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += latency
+            histogram[2] += 1
+            if identifier is not None:
+                error_key = key + (identifier,)
+                self.errors[error_key] = self.errors.get(error_key, 0) + 1
+
+    def timed_out(self, service_id, address):
+        """
+        Count a request abandoned before its response
+
+        Parameters
+        ----------
+        service_id : int
+            StuCan2 service identifier
+
+        address : int
+            Targeted device or group address
+        """
+        key = (service_id, address)
+        with self.lock:
+            self.timeouts[key] = self.timeouts.get(key, 0) + 1
+
+    def unexpected_response(self):
+        """
+        Count a response matching no pending request
+        """
+        with self.lock:
+            self.unexpected += 1
+
+    def latency_quantile(self, service_id, address, quantile):
+        """
+        Estimate a quantile of the response times from the histogram
+
+        Parameters
+        ----------
+        service_id : int
+            StuCan2 service identifier
+
+        address : int
+            Targeted device or group address
+
+        quantile : float
+            Quantile between 0 and 1, e.g. 0.99
+
+        Returns
+        -------
+        float
+            Upper bound in seconds of the bucket holding the quantile, infinity when it falls in the last bucket and
+            None when no response was received
+        """
+        assert 0 <= quantile <= 1
+        with self.lock:
+            histogram = self.latencies.get((service_id, address))
+            if histogram is None:
+                return None
+            counts, count = list(histogram[0]), histogram[2]
+        rank = quantile * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            if cumulative >= rank and cumulative > 0:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        """
+        Retreive a consistent copy of every metric
+
+        Returns
+        -------
+        dict
+            'requests', 'errors' and 'timeouts' counters as described in the class attributes, 'unexpected' count and
+            'latency' as {'buckets': [(upper_bound, cumulative_count), ...], 'sum': seconds, 'count': responses} keyed
+            by (service_id, address)
+        """
+        with self.lock:
+            latencies = {key: (list(counts), total, count) for key, (counts, total, count) in self.latencies.items()}
+            snapshot = {'requests': dict(self.requests), 'errors': dict(self.errors), 'timeouts': dict(self.timeouts),
+                        'unexpected': self.unexpected}
+        snapshot['latency'] = {}
+        for key, (counts, total, count) in latencies.items():
+            cumulative, buckets = 0, []
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                buckets.append((bound, cumulative))
+            snapshot['latency'][key] = {'buckets': buckets, 'sum': total, 'count': count}
+        return snapshot
+
+    def reset(self):
+        """
+        Set every counter and histogram back to zero
+        """
+        with self.lock:
+            self.requests.clear()
+            self.errors.clear()
+            self.timeouts.clear()
+            self.latencies.clear()
+            self.unexpected = 0
+
+    def prometheus(self, labels=None, gauges=None):
+        """
+        Export the metrics in the Prometheus text exposition format
+
+        Parameters
+        ----------
+        labels : dict
+            Labels added to every sample, e.g. {'node': '0'}
+
+        gauges : dict
+            Additional gauges as (value, description) tuples keyed by metric name, e.g.
+            {'xcomcan_congestion_window': (8, 'Congestion window size')}
+
+        Returns
+        -------
+        string
+            Text to serve on a /metrics endpoint
+
+        Example
+        -------
+        .. code-block:: python
+
+            with StuCanPublicClient(0x00, CAN_BUS_SPEED, bustype='kvaser') as client:
+                ...
+                print(client.node.prometheus_metrics())
+        """
+        snapshot = self.snapshot()
+        common = dict(labels or {})
+        lines = []
+
+        def sample(name, value, **sample_labels):
+            all_labels = dict(common, **sample_labels)
+            text = ','.join('{}="{}"'.format(key, str(label).replace('\\', '\\\\').replace('"', '\\"'))
+                            for key, label in all_labels.items())
+            lines.append('{}{} {}'.format(name, '{' + text + '}' if text else '', _format_value(value)))
+
+        def header(name, kind, description):
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        header('xcomcan_requests_total', 'counter', 'Requests sent on the CAN bus')
+        for (service_id, address), count in sorted(snapshot['requests'].items()):
+            sample('xcomcan_requests_total', count, service=_service_name(service_id), address=address)
+        header('xcomcan_errors_total', 'counter', 'Error frames received in response to a request')
+        for (service_id, address, identifier), count in sorted(snapshot['errors'].items()):
+            sample('xcomcan_errors_total', count, service=_service_name(service_id), address=address,
+                   error=identifier)
+        header('xcomcan_timeouts_total', 'counter', 'Requests abandoned without response')
+        for (service_id, address), count in sorted(snapshot['timeouts'].items()):
+            sample('xcomcan_timeouts_total', count, service=_service_name(service_id), address=address)
+        header('xcomcan_unexpected_responses_total', 'counter', 'Responses matching no pending request')
+        sample('xcomcan_unexpected_responses_total', snapshot['unexpected'])
+        header('xcomcan_response_seconds', 'histogram', 'Time between a request and its response')
+        for (service_id, address), histogram in sorted(snapshot['latency'].items()):
+            service = _service_name(service_id)
+            for bound, count in histogram['buckets']:
+                sample('xcomcan_response_seconds_bucket', count, service=service, address=address,
+                       le=_format_value(bound))
+            sample('xcomcan_response_seconds_sum', histogram['sum'], service=service, address=address)
+            sample('xcomcan_response_seconds_count', histogram['count'], service=service, address=address)
+        for name, (value, description) in sorted((gauges or {}).items()):
+            header(name, 'gauge', description)
+            sample(name, value)
+        return '\n'.join(lines) + '\n'
+
+
+def _service_name(service_id):
+    return SERVICE_NAMES.get(service_id, str(service_id))
+
+
+def _format_value(value):
+    # the exposition format spells the special values NaN, +Inf and -Inf
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(value)
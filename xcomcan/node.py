@@ -2,39 +2,90 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from struct import pack, unpack
-from threading import Condition
-from stucancommon.node import Service, CanNode, Timeout
-from .addresses import RCC_GROUP_DEVICE_ID
+from collections import deque
+from struct import Struct
+from threading import Condition, Event, Lock
+from time import monotonic
+from stucancommon.node import CanNode, Timeout
+from .addresses import RCC_GROUP_DEVICE_ID, XT_GROUP_DEVICE_ID, VT_GROUP_DEVICE_ID, BSP_GROUP_DEVICE_ID
+from .addresses import VS_GROUP_DEVICE_ID
+from .metrics import NodeMetrics
 
 logger = logging.getLogger(__name__)
 
 
-class Request(Service):
+class PublicService:
     """
-    Base class for a request service that have a condition to wait until notification from another thread
+    Base class for the services of the StuCan public protocol, the PACK_FORMAT of every subclass is compiled once
+    into a `struct.Struct`. Subclasses declare their fields in `__slots__` to keep the objects built for every frame
+    compact, it implements the `stucancommon.node.Service` interface without inheriting from it as that class has
+    no `__slots__` and would give every object a `__dict__`
     """
-    cv = Condition()
-
-
-class Response(Service):
+    __slots__ = ()
+    OBJECT_ID_FIELD = 'parameter_id'
+    """
+    const string :
+        Name of the attribute holding the object identifier (User Info or Parameter id number)
+    """
+    PART_FIELD = None
     """
-    Base class for a response service
+    const string :
+        Name of the attribute holding the Parameter part, None for the services without part
     """
 
-    def handle(self, source_address, destination_address, exception=None):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'PACK_FORMAT' in vars(cls):
+            cls.STRUCT = Struct(cls.PACK_FORMAT)
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """
+        Unpack Service data buffer with the precompiled codec
+        """
+        return cls(*cls.STRUCT.unpack_from(buffer))
+
+    def handle(self, source_address, destination_address, exeption=None):
         """
-        Method override, handle response from a previously sended Service. It will handle response object and notify
-        request service on success otherwise forward exception
+        Method intended to be overriden by childs handling a received frame, returns the service to send back or None
         """
-        with self.request_class.cv:
-            if exception is None:
-                self.request_class.response = self
-            else:
-                self.request_class.response = exception
-            self.request_class.response_count -= 1
-            if self.request_class.response_count == 0:
-                self.request_class.cv.notify()
+        pass
+
+    @property
+    def object_id(self):
+        """
+        int :
+            Object identifier the service refers to
+        """
+        return getattr(self, self.OBJECT_ID_FIELD)
+
+    @property
+    def correlation_id(self):
+        """
+        tuple :
+            Identifiers matching a response to its request, the object identifier and the part if the service has one
+        """
+        if self.PART_FIELD is None:
+            return (getattr(self, self.OBJECT_ID_FIELD),)
+        return getattr(self, self.OBJECT_ID_FIELD), getattr(self, self.PART_FIELD)
+
+    def __repr__(self):
+        return "{}{}".format(type(self).__name__, {name: getattr(self, name) for name in self.__slots__})
+
+
+class Request(PublicService):
+    """
+    Base class for a request service, its response is matched by the node using the destination address,
+    the service identifier, the object identifier and the Parameter part
+    """
+    __slots__ = ()
+
+
+class Response(PublicService):
+    """
+    Base class for a response service, it is dispatched by the node to the matching pending request
+    """
+    __slots__ = ()
 
 
 class ReadUserInfoRequest(Request):
@@ -46,17 +97,20 @@ class ReadUserInfoRequest(Request):
     const int :
         Service identifier
     """
+    OBJECT_ID_FIELD = 'info_id'
     PACK_FORMAT = '>H'
     """
     const string :
         Format to generate a byte-string representation of the object
     """
 
+    __slots__ = ('info_id',)
+
     def __init__(self, *args):
         self.info_id = args[0]
 
     def __bytes__(self):
-        return pack(self.PACK_FORMAT, self.info_id)
+        return self.STRUCT.pack(self.info_id)
 
 
 class ReadUserInfoResponse(Response):
@@ -68,6 +122,7 @@ class ReadUserInfoResponse(Response):
     const int :
         Service identifier
     """
+    OBJECT_ID_FIELD = 'info_id'
     PACK_FORMAT = '>Hf'
     """
     const string :
@@ -78,11 +133,13 @@ class ReadUserInfoResponse(Response):
     Request service object
     """
 
+    __slots__ = ('info_id', 'value')
+
     def __init__(self, *args):
         self.info_id, self.value = args[:2]
 
     def __bytes__(self):
-        return pack(self.PACK_FORMAT, self.info_id, self.value)
+        return self.STRUCT.pack(self.info_id, self.value)
 
 
 class WriteParameterRequest(Request):
@@ -99,12 +156,15 @@ class WriteParameterRequest(Request):
     const string :
         Format to generate a byte-string representation of the object
     """
+    PART_FIELD = 'part'
+
+    __slots__ = ('parameter_id', 'part', 'value')
 
     def __init__(self, *args):
         self.parameter_id, self.part, self.value = args[:3]
 
     def __bytes__(self):
-        return pack(self.PACK_FORMAT, self.parameter_id, self.part, self.value)
+        return self.STRUCT.pack(self.parameter_id, self.part, self.value)
 
 
 class WriteParameterResponse(Response):
@@ -125,12 +185,15 @@ class WriteParameterResponse(Response):
     """
     Request service object
     """
+    PART_FIELD = 'part'
+
+    __slots__ = ('parameter_id', 'part', 'value')
 
     def __init__(self, *args):
         self.parameter_id, self.part, self.value = args[:3]
 
     def __bytes__(self):
-        return pack(self.PACK_FORMAT, self.parameter_id, self.part, self.value)
+        return self.STRUCT.pack(self.parameter_id, self.part, self.value)
 
 
 class ReadParameterRequest(Request):
@@ -147,12 +210,15 @@ class ReadParameterRequest(Request):
     const string :
         Format to generate a byte-string representation of the object
     """
+    PART_FIELD = 'part'
+
+    __slots__ = ('parameter_id', 'part')
 
     def __init__(self, *args):
         self.parameter_id, self.part = args[:2]
 
     def __bytes__(self):
-        return pack(self.PACK_FORMAT, self.parameter_id, self.part)
+        return self.STRUCT.pack(self.parameter_id, self.part)
 
 
 class ReadParameterResponse(Response):
@@ -173,12 +239,15 @@ class ReadParameterResponse(Response):
     """
     Request service object
     """
+    PART_FIELD = 'part'
+
+    __slots__ = ('parameter_id', 'part', 'value')
 
     def __init__(self, *args):
         self.parameter_id, self.part, self.value = args[:3]
 
     def __bytes__(self):
-        return pack(self.PACK_FORMAT, self.parameter_id, self.part, self.value)
+        return self.STRUCT.pack(self.parameter_id, self.part, self.value)
 
 
 class MessageNotification(Response):
@@ -190,25 +259,164 @@ class MessageNotification(Response):
     const int :
         Service identifier
     """
+    OBJECT_ID_FIELD = 'message_id'
     PACK_FORMAT = '>HI'
     """
     const string :
         Format to generate a byte-string representation of the object
     """
-    messages = []
-    """
-    list :
-        List of messages
-    """
+
+    __slots__ = ('message_id', 'value')
 
     def __init__(self, *args):
         self.message_id, self.value = args[:2]
 
     def __bytes__(self):
-        return pack(self.PACK_FORMAT, self.message_id, self.value)
+        return self.STRUCT.pack(self.message_id, self.value)
 
-    def handle(self, source_address, destination_address, exception=None):
-        self.messages.append((source_address, self))
+
+class MessageBuffer:
+    """
+    Class representing a fixed capacity ring buffer of message notifications, every message gets a monotonically
+    increasing sequence number so that readers only fetch the messages they did not see yet
+
+    Attributes
+    ----------
+    capacity : int
+        Maximum number of messages kept
+    sequence : int
+        Sequence number of the last message received, 0 when none
+    dropped : int
+        Number of messages overwritten by the buffer overflow
+    """
+
+    def __init__(self, capacity=1000):
+        """
+        capacity : int
+            Maximum number of messages kept
+        """
+        assert capacity >= 1
+        self.capacity = capacity
+        self.entries = [None] * capacity
+        self.sequence = 0
+        self.dropped = 0
+        self.lock = Lock()
+        self.cv = Condition(self.lock)
+        self.listeners = []
+        self.closed = False
+
+    def append(self, source_address, message):
+        """
+        Store a message, overwriting the oldest one when the buffer is full
+
+        Parameters
+        ----------
+        source_address : int
+            Address of the device that sent the message
+
+        message : MessageNotification
+            Message received
+
+        Returns
+        -------
+        int
+            Sequence number of the message
+        """
+        with self.lock:
+            self.sequence += 1
+            if self.sequence > self.capacity:
+                self.dropped += 1
+            self.entries[self.sequence % self.capacity] = (self.sequence, source_address, message)
+            self.cv.notify_all()
+            listeners = list(self.listeners)
+        self._notify(listeners)
+        return self.sequence
+
+    def since(self, sequence=0):
+        """
+        Retreive the messages received after a sequence number, in O(number of new messages)
+
+        Parameters
+        ----------
+        sequence : int
+            Sequence number of the last message already seen, 0 for every message kept
+
+        Returns
+        -------
+        list
+            (sequence, source_address, message) tuples, oldest first
+        """
+        with self.lock:
+            return self._since(sequence)
+
+    def _since(self, sequence):
+        first = max(sequence + 1, self.sequence - self.capacity + 1, 1)
+        return [self.entries[index % self.capacity] for index in range(first, self.sequence + 1)]
+
+    def wait(self, sequence, timeout=None):
+        """
+        Wait for messages newer than a sequence number
+
+        Parameters
+        ----------
+        sequence : int
+            Sequence number of the last message already seen
+
+        timeout : float
+            Maximum waiting time in seconds, None to wait until a message arrives or the buffer is closed
+
+        Returns
+        -------
+        list
+            (sequence, source_address, message) tuples, empty on timeout or when the buffer is closed
+        """
+        with self.lock:
+            self.cv.wait_for(lambda: self.sequence > sequence or self.closed, timeout)
+            return self._since(sequence)
+
+    def add_listener(self, listener):
+        """
+        Register a callable invoked without argument from the receiving thread after each new message, it must not
+        block. An exception raised by a listener is logged and does not stop the node
+
+        Parameters
+        ----------
+        listener : callable
+            Function to call
+        """
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unregister a callable previously registered with add_listener, nothing is done if it is not registered
+
+        Parameters
+        ----------
+        listener : callable
+            Function to forget
+        """
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def close(self):
+        """
+        Wake up every waiter for good, called when the node stops
+        """
+        with self.lock:
+            self.closed = True
+            self.cv.notify_all()
+            listeners = list(self.listeners)
+        self._notify(listeners)
+
+    @staticmethod
+    def _notify(listeners):
+        for listener in listeners:
+            try:
+                listener()
+            except Exception:
+                logger.exception('message listener %r failed', listener)
 
 
 error_identifier_dictionary = {
@@ -236,6 +444,12 @@ They are coded in the response in case of a request failure.
 """
 
 
+ERROR_STRUCT = Struct('>HI')
+"""
+Codec of the data of an error frame: object identifier and error code
+"""
+
+
 class StuCanPublicError(Exception):
     """
     Class representing a StuCan2 error, also can generate a string representation of it
@@ -258,12 +472,438 @@ class StuCanPublicError(Exception):
                                                                                self.identifier)
 
 
+GROUP_DEVICE_IDS = (XT_GROUP_DEVICE_ID, VT_GROUP_DEVICE_ID, BSP_GROUP_DEVICE_ID, VS_GROUP_DEVICE_ID)
+"""
+Multicast addresses accepted by the Read User Info, Read Parameter and Write Parameter services
+"""
+
+
+def group_of(address):
+    """
+    Retreive the multicast group address a unicast device address belongs to
+
+    Parameters
+    ----------
+    address : int
+        Device address
+
+    Returns
+    -------
+    int
+        Group address, None if the address belongs to no multicast group
+    """
+    group_address = address - address % 100
+    if group_address in GROUP_DEVICE_IDS:
+        return group_address
+    return None
+
+
+class PendingRequest:
+    """
+    Class representing a request sent on the CAN bus and waiting for its response
+
+    Attributes
+    ----------
+    address : int
+        Targeted device address
+    request : Request
+        Request service object
+    key : tuple
+        Correlation key (address, service identifier, object identifier[, part]) used to match the response, the
+        Parameter services also carry the part
+    response : Response or StuCanPublicError
+        Response received for the request, None while pending
+    """
+
+    def __init__(self, address, request):
+        """
+        address : int
+            Targeted device address
+
+        request : Request
+            Request service object
+        """
+        self.address = address
+        self.request = request
+        self.key = (address, request.SERVICE_ID) + request.correlation_id
+        self.response = None
+        self.event = Event()
+        self.lock = Lock()
+        self.callbacks = []
+        self.sequence = None
+        self.submitted_time = monotonic()
+        self.sent_time = None
+
+    def done(self):
+        """
+        Returns
+        -------
+        bool
+            True when the response has been received
+        """
+        return self.event.is_set()
+
+    def deadline(self, timeout):
+        """
+        Parameters
+        ----------
+        timeout : float
+            Response timeout in seconds
+
+        Returns
+        -------
+        float
+            Monotonic time at which the request times out, counted from the transmission of the frame or, while the
+            request is still queued behind the congestion window, from its submission
+        """
+        return (self.submitted_time if self.sent_time is None else self.sent_time) + timeout
+
+    def wait(self, timeout=None, deadline=None):
+        """
+        Wait for the response, the timeout is counted from the transmission of the frame so that the time spent
+        queued behind the congestion window is not accounted. A request still queued `timeout` after its submission
+        times out, the wait lasts at most twice the timeout
+
+        Parameters
+        ----------
+        timeout : float
+            Response timeout in seconds, None to wait forever
+
+        deadline : float
+            Monotonic time at which the wait ends whether the frame has been transmitted or not, None for no bound
+
+        Returns
+        -------
+        bool
+            True if the response has been received
+        """
+        if timeout is None and deadline is None:
+            return self.event.wait()
+        while not self.event.wait(max(0, self._wait_end(timeout, deadline) - monotonic())):
+            if self._wait_end(timeout, deadline) <= monotonic():
+                return self.event.is_set()
+        return True
+
+    def _wait_end(self, timeout, deadline):
+        end = float('inf') if timeout is None else self.deadline(timeout)
+        return end if deadline is None else min(end, deadline)
+
+    def add_done_callback(self, callback):
+        """
+        Register a callable invoked with this pending request once the response is received, called immediately
+        if the response is already there. Callbacks run in the node receiving thread and must not block, an exception
+        raised by a callback is logged and does not stop the node
+
+        Parameters
+        ----------
+        callback : callable
+            Function taking the pending request as single argument
+        """
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        self._run_callback(callback)
+
+    def set_response(self, response):
+        """
+        Store the response (or the error) and wake up every waiter
+
+        Parameters
+        ----------
+        response : Response or StuCanPublicError
+            Response service object or error received
+        """
+        with self.lock:
+            self.response = response
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback(self)
+        except Exception:
+            logger.exception('done callback %r of request %s failed', callback, self.key)
+
+    def result(self, timeout=None, deadline=None):
+        """
+        Wait for the response, can raise a timeout exception a StuCanPublicError or return the response when
+        successfull
+
+        Parameters
+        ----------
+        timeout : float
+            Response timeout in seconds counted from the transmission of the frame, None to wait forever
+
+        deadline : float
+            Monotonic time at which the wait ends whether the frame has been transmitted or not, None for no bound
+
+        Returns
+        -------
+        Response
+            Response object of the service
+        """
+        if not self.wait(timeout, deadline):
+            raise Timeout()
+        if isinstance(self.response, StuCanPublicError):
+            raise self.response
+        return self.response
+
+
+CONGESTION_ERROR_CODES = (0x03, 0x13)
+"""
+Error codes (RESPONSE_TIMEOUT and GATEWAY_BUSY) signaling that the Xcom-CAN is overloaded
+"""
+
+
+class CongestionWindow:
+    """
+    Class representing the number of requests allowed in flight, adapted AIMD-style (additive increase,
+    multiplicative decrease). The window grows by one request per window of successful responses and is cut down on
+    GATEWAY_BUSY, RESPONSE_TIMEOUT or a lost frame, at most once per round trip. As the node keeps the window full,
+    the send rate follows what the gateway can handle.
+
+    Attributes
+    ----------
+    size : float
+        Current window size
+    in_flight : int
+        Number of requests sent and not yet answered
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=64, decrease=0.5):
+        """
+        initial : int
+            Initial window size
+
+        minimum : int
+            Lower bound of the window size
+
+        maximum : int
+            Upper bound of the window size
+
+        decrease : float
+            Factor applied to the window size on congestion
+        """
+        assert 1 <= minimum <= initial <= maximum
+        assert 0 < decrease < 1
+        self.size = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.sequence = 0
+        self.recovery_sequence = 0
+
+    def available(self):
+        """
+        Returns
+        -------
+        bool
+            True when one more request can be sent
+        """
+        return self.in_flight < int(self.size)
+
+    def acquire(self):
+        """
+        Take a slot of the window
+
+        Returns
+        -------
+        int
+            Sequence number of the request
+        """
+        self.in_flight += 1
+        self.sequence += 1
+        return self.sequence
+
+    def release(self, sequence, congested):
+        """
+        Give back a slot of the window and adapt its size
+
+        Parameters
+        ----------
+        sequence : int
+            Sequence number returned by acquire
+
+        congested : bool
+            True if the request failed because of a congestion signal
+        """
+        self.in_flight -= 1
+        if not congested:
+            self.size = min(self.maximum, self.size + 1 / self.size)
+        elif sequence > self.recovery_sequence:
+            # requests sent before the last decrease do not decrease the window again
+            self.size = max(self.minimum, self.size * self.decrease)
+            self.recovery_sequence = self.sequence
+
+
+class RoundTripTimes:
+    """
+    Class representing the round-trip time of the requests to each device, estimated as a smoothed mean and
+    variance (Jacobson/Karels). The derived response timeout is the mean plus four times the variance, bounded by
+    a floor and a ceiling, and doubles after each timeout of the device until a response is received again
+
+    Attributes
+    ----------
+    estimates : dict
+        [smoothed round-trip time, round-trip time variance, backoff factor] keyed by device address
+    """
+
+    def __init__(self, floor=0.05, ceiling=1.0, gain=0.125, variance_gain=0.25):
+        """
+        floor : float
+            Lower bound in seconds of the derived timeouts, it covers the jitter a short history does not show
+
+        ceiling : float
+            Upper bound in seconds of the derived timeouts, also the timeout of a device without round-trip time
+            measured yet
+
+        gain : float
+            Weight of a new measure in the smoothed round-trip time
+
+        variance_gain : float
+            Weight of a new measure in the round-trip time variance
+        """
+        assert 0 < floor <= ceiling
+        self.floor = floor
+        self.ceiling = ceiling
+        self.gain = gain
+        self.variance_gain = variance_gain
+        self.estimates = {}
+        self.lock = Lock()
+
+    def update(self, address, sample):
+        """
+        Account a measured round-trip time
+
+        Parameters
+        ----------
+        address : int
+            Device address
+
+        sample : float
+            Seconds elapsed between the transmission of a request and its response
+        """
+        with self.lock:
+            estimate = self.estimates.get(address)
+            if estimate is None:
+                self.estimates[address] = [sample, sample / 2, 1]
+                return
+            estimate[1] += self.variance_gain * (abs(sample - estimate[0]) - estimate[1])
+            estimate[0] += self.gain * (sample - estimate[0])
+            estimate[2] = 1
+
+    def timed_out(self, address):
+        """
+        Double the timeout of a device after a request got no response
+
+        Parameters
+        ----------
+        address : int
+            Device address
+        """
+        with self.lock:
+            estimate = self.estimates.get(address)
+            if estimate is not None:
+                estimate[2] = min(estimate[2] * 2, 64)
+
+    def timeout(self, address):
+        """
+        Parameters
+        ----------
+        address : int
+            Device address
+
+        Returns
+        -------
+        float
+            Response timeout in seconds derived from the round-trip times of the device
+        """
+        estimate = self.estimates.get(address)
+        if estimate is None:
+            return self.ceiling
+        smoothed, variance, backoff = estimate
+        return min(self.ceiling, max(self.floor, smoothed + 4 * variance) * backoff)
+
+
+class GroupRequest(PendingRequest):
+    """
+    Class representing a request sent to a multicast group address, it collects the response of every device of
+    the group until the quorum is reached or the timeout expires
+
+    Attributes
+    ----------
+    quorum : int
+        Number of responses completing the request, None to collect until the timeout
+    responses : dict
+        Response or StuCanPublicError received, keyed by source address
+    """
+
+    def __init__(self, address, request, quorum=None):
+        """
+        address : int
+            Targeted group address
+
+        request : Request
+            Request service object
+
+        quorum : int
+            Number of responses completing the request, None to collect until the timeout
+        """
+        PendingRequest.__init__(self, address, request)
+        self.quorum = quorum
+        self.responses = {}
+
+    def add_response(self, source_address, response):
+        """
+        Store the response of one device of the group, wake up waiters once the quorum is reached
+
+        Parameters
+        ----------
+        source_address : int
+            Responding device address
+
+        response : Response or StuCanPublicError
+            Response service object or error received
+        """
+        self.responses[source_address] = response
+        if self.quorum is not None and len(self.responses) >= self.quorum and not self.done():
+            self.set_response(self.responses)
+
+    def result(self, timeout=None):
+        """
+        Wait for the quorum or the timeout, can raise a timeout exception if no device answered or a
+        StuCanPublicError if the gateway rejected the request itself
+
+        Parameters
+        ----------
+        timeout : float
+            Collecting time in seconds counted from the transmission of the frame, None to wait forever (only
+            sensible with a quorum)
+
+        Returns
+        -------
+        dict
+            Response or StuCanPublicError, keyed by source address
+        """
+        self.wait(timeout)
+        responses = dict(self.responses)
+        if not responses:
+            raise Timeout()
+        if isinstance(responses.get(self.address), StuCanPublicError) and len(responses) == 1:
+            raise responses[self.address]
+        return responses
+
+
 class StuCanPublicNode(CanNode):
     """
     Class representing a StuCan public node, inherits from `CanNode`
     """
 
-    def __init__(self, driver, address, debug=False):
+    def __init__(self, driver, address, debug=False, message_capacity=1000, round_trip_times=None, name=None):
         """
         Initialize CanNode
 
@@ -272,10 +912,51 @@ class StuCanPublicNode(CanNode):
 
         address : int
             Node CAN address
+
+        debug : boolean
+            Print the frames of this node on stderr, only the node logger ("xcomcan.node.<name>") is configured,
+            the logging configuration of the application is left untouched
+
+        message_capacity : int
+            Number of message notifications kept, refer to :class:`MessageBuffer`
+
+        round_trip_times : RoundTripTimes
+            Estimator of the round-trip time to each device, default to RoundTripTimes()
+
+        name : string
+            Name of the node logger below "xcomcan.node", default to the node address. Nodes sharing an address on
+            several CAN buses need distinct names to be traced separately
+
+        Notes
+        -----
+        Debug traces cost nothing unless the node logger is enabled for DEBUG. The `frame_trace` attribute can also be
+        set to a callable(direction, identifier, data, timestamp) called with 'rx' for every frame received and 'tx'
+        for every frame sent
+
+        Requests, errors, timeouts and response times are counted in the `metrics` attribute, refer to
+        :class:`xcomcan.metrics.NodeMetrics`
         """
         CanNode.__init__(self, driver, address)
+        self.accepted_addresses = frozenset((address, RCC_GROUP_DEVICE_ID))
+        self.dispatch = {}
+        self.correlated_services = set()
+        self.notifications = MessageBuffer(message_capacity)
+        self.pending = {}
+        self.pending_parts = {}
+        self.pending_lock = Lock()
+        self.congestion = CongestionWindow()
+        self.backlog = deque()
+        self.frame_trace = None
+        self.metrics = NodeMetrics()
+        self.round_trip_times = round_trip_times if round_trip_times is not None else RoundTripTimes()
+        self.logger = logger.getChild(str(address) if name is None else name)
         if debug is True:
-            logging.basicConfig(level=logging.DEBUG)
+            self.logger.setLevel(logging.DEBUG)
+            if not self.logger.handlers:
+                handler = logging.StreamHandler()
+                handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+                self.logger.addHandler(handler)
+                self.logger.propagate = False
 
     def handle_rx_frame(self, identifier, data, dlc, flag, time):
         """
@@ -291,28 +972,55 @@ class StuCanPublicNode(CanNode):
         data : bytes
             CAN frame data
         """
+        if self.frame_trace is not None:
+            self.frame_trace('rx', identifier, data, time)
         destination_address = (identifier >> 19) & 0x3FF
-        if not (destination_address in (self.address, RCC_GROUP_DEVICE_ID)):
+        if destination_address not in self.accepted_addresses:
             return
-        source_address = (identifier >> 9) & 0x3FF
         service_id = (identifier >> 6) & 0x7
-        flags = identifier & 0x3F
-        error = flags & 0x1
-        for service_class in self.services:
-            if service_id == service_class.SERVICE_ID:
-                if error == 1:
-                    id, error_code = unpack('>HI', data)
-                    exception = StuCanPublicError(id, error_code)
-                    logger.debug('<- rx: %s from address %d to %d', repr(exception), source_address,
-                                 destination_address)
-                    service = service_class(None, None, None)
-                    response = service.handle(source_address, destination_address, exception)
-                else:
-                    service = service_class.from_bytes(data)
-                    logger.debug('<- rx: %s from address %d to %d', str(service), source_address, destination_address)
-                    response = service.handle(source_address, destination_address)
-                if response is not None:
-                    self.send_service(source_address, response)
+        service_classes = self.dispatch.get(service_id)
+        if service_classes is None:
+            return
+        source_address = (identifier >> 9) & 0x3FF
+        error = identifier & 0x1
+        trace = self.logger.isEnabledFor(logging.DEBUG)
+        for service_class in service_classes:
+            if error == 1:
+                id, error_code = ERROR_STRUCT.unpack_from(data)
+                exception = StuCanPublicError(id, error_code)
+                if trace:
+                    self.logger.debug('<- rx: %r from address %d to %d', exception, source_address,
+                                      destination_address)
+                # errors only answer requests, no service object is built for them, they do not carry the part
+                if service_class in self.correlated_services:
+                    self.resolve((source_address, service_id, id), exception)
+                continue
+            service = service_class.from_bytes(data)
+            if trace:
+                self.logger.debug('<- rx: %s from address %d to %d', service, source_address, destination_address)
+            if service_class in self.correlated_services:
+                self.resolve((source_address, service_id) + service.correlation_id, service)
+                continue
+            if service_class is MessageNotification:
+                self.notifications.append(source_address, service)
+                continue
+            response = service.handle(source_address, destination_address)
+            if response is not None:
+                self.send_service(source_address, response)
+
+    def add_service(self, handler):
+        """
+        Method override, also index the service by its identifier so that received frames are dispatched in O(1)
+
+        Parameters
+        ----------
+        handler : Service
+            Service class handling the received frames with its SERVICE_ID
+        """
+        CanNode.add_service(self, handler)
+        self.dispatch[handler.SERVICE_ID] = self.dispatch.get(handler.SERVICE_ID, ()) + (handler,)
+        if hasattr(handler, 'request_class'):
+            self.correlated_services.add(handler)
 
     def send_from(self, service_id, destination_address, source_address, data):
         """
@@ -336,6 +1044,8 @@ class StuCanPublicNode(CanNode):
         assert 0 <= destination_address <= 0x3FF
         assert 0 <= source_address <= 0x3FF
         identifier = (destination_address << 19) + (source_address << 9) + (service_id << 6)
+        if self.frame_trace is not None:
+            self.frame_trace('tx', identifier, data, None)
         self.driver.send(identifier, data, is_extended_id=True)
 
     def send(self, service_id, destination_address, data):
@@ -367,12 +1077,209 @@ class StuCanPublicNode(CanNode):
         service : Service
             Service object
         """
-        logger.debug('-> tx: %s to address %d', str(service), address)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('-> tx: %s to address %d', service, address)
         data = bytes(service)
         assert len(data) <= 8
         self.send(service.SERVICE_ID, address, data)
 
-    def wait_response(self, address, request, timeout=None):
+    def resolve(self, key, response):
+        """
+        Hand a received response over to the oldest request sent with the same correlation key, then to a request
+        sent to the group of the source address. Error frames carry no part, an error of a Parameter
+        service goes to the oldest request sent for the object whatever its part. Responses that match no pending
+        request are dropped
+
+        Parameters
+        ----------
+        key : tuple
+            Correlation key (source address, service identifier, object identifier[, part]), without part for errors
+
+        response : Response or StuCanPublicError
+            Response service object or error received
+        """
+        source_address = key[0]
+        with self.pending_lock:
+            pending = self._oldest_sent(self._pending_queue(key))
+            if pending is None and group_of(source_address) is not None:
+                pending = self._oldest_sent(self._pending_queue((group_of(source_address),) + key[1:]))
+            if pending is None:
+                self.metrics.unexpected_response()
+                self.logger.debug('<- rx: unexpected response %s', key)
+                return
+            if not isinstance(pending, GroupRequest):
+                queue = self.pending[pending.key]
+                queue.remove(pending)
+                if not queue:
+                    self._drop_queue(pending.key)
+        if pending.sent_time is not None:
+            elapsed = monotonic() - pending.sent_time
+            self.metrics.response_received(pending.key[1], pending.address, elapsed,
+                                           response.identifier if isinstance(response, StuCanPublicError) else None)
+            # errors may be answered by the gateway itself, only responses of the device measure its round trip
+            if not isinstance(response, StuCanPublicError) and not isinstance(pending, GroupRequest):
+                self.round_trip_times.update(pending.address, elapsed)
+        if isinstance(pending, GroupRequest):
+            pending.add_response(source_address, response)
+        else:
+            congested = isinstance(response, StuCanPublicError) and response.error_code in CONGESTION_ERROR_CODES
+            self._release(pending, congested)
+            pending.set_response(response)
+
+    def _pending_queue(self, key):
+        queue = self.pending.get(key)
+        if queue is None and key in self.pending_parts:
+            # an error of a Parameter service, the oldest request sent among the parts answers it
+            queue = min((self.pending[part_key] for part_key in self.pending_parts[key]),
+                        key=lambda candidate: candidate[0].sequence or float('inf'))
+        return queue
+
+    @staticmethod
+    def _oldest_sent(queue):
+        # a late response of a cancelled request must not resolve a request still queued behind the congestion window
+        if queue:
+            for pending in queue:
+                if pending.sent_time is not None:
+                    return pending
+        return None
+
+    def _drop_queue(self, key):
+        del self.pending[key]
+        if len(key) > 3:
+            part_keys = self.pending_parts[key[:3]]
+            part_keys.discard(key)
+            if not part_keys:
+                del self.pending_parts[key[:3]]
+
+    def submit(self, address, request, congestion_control=True):
+        """
+        Send a request without waiting, several requests can be in flight at the same time. The response is matched
+        using the correlation key (address, service identifier, object identifier[, part]). When the congestion window
+        is full the request is queued and sent as soon as a slot is released
+
+        Parameters
+        ----------
+        address : int
+            Targeted device address
+
+        request : Request
+            Request service object
+
+        congestion_control : bool
+            False to send the request right away, outside of the congestion window, e.g. the discovery probes of
+            addresses that are not expected to answer
+
+        Returns
+        -------
+        PendingRequest
+            Handle to wait for the response
+        """
+        return self._register(PendingRequest(address, request), congestion_control)
+
+    def submit_group(self, group_address, request, quorum=None):
+        """
+        Send a request to a multicast group address without waiting, responses of every device of the group are
+        collected by the returned handle
+
+        Parameters
+        ----------
+        group_address : int
+            Targeted group address, one of GROUP_DEVICE_IDS
+
+        request : Request
+            Request service object
+
+        quorum : int
+            Number of responses completing the request, None to collect until the timeout
+
+        Returns
+        -------
+        GroupRequest
+            Handle to wait for the responses
+        """
+        assert group_address in GROUP_DEVICE_IDS
+        return self._register(GroupRequest(group_address, request, quorum))
+
+    def _register(self, pending, congestion_control=True):
+        with self.pending_lock:
+            queue = self.pending.get(pending.key)
+            if queue is None:
+                queue = self.pending[pending.key] = deque()
+                if len(pending.key) > 3:
+                    self.pending_parts.setdefault(pending.key[:3], set()).add(pending.key)
+            queue.append(pending)
+            if congestion_control:
+                if self.backlog or not self.congestion.available():
+                    self.backlog.append(pending)
+                    return pending
+                pending.sequence = self.congestion.acquire()
+        try:
+            self._send_pending(pending)
+        except Exception:
+            self.cancel(pending)
+            raise
+        return pending
+
+    def _send_pending(self, pending):
+        pending.sent_time = monotonic()
+        self.metrics.request_sent(pending.key[1], pending.address)
+        self.send_service(pending.address, pending.request)
+
+    def _release(self, pending, congested):
+        """
+        Give back the congestion window slot held by a pending request and send the backlog requests that now fit
+        into the window
+        """
+        ready = []
+        with self.pending_lock:
+            if pending.sequence is None:
+                return
+            self.congestion.release(pending.sequence, congested)
+            pending.sequence = None
+            while self.backlog and self.congestion.available():
+                next_pending = self.backlog.popleft()
+                next_pending.sequence = self.congestion.acquire()
+                ready.append(next_pending)
+        for next_pending in ready:
+            try:
+                self._send_pending(next_pending)
+            except Exception as exception:
+                self.logger.warning('-> tx: sending %s failed: %r', next_pending.key, exception)
+                self._release(next_pending, False)
+
+    def cancel(self, pending, lost=True):
+        """
+        Remove a request from the correlation table, a late response will then be dropped. A request cancelled
+        before its response is accounted as lost by the congestion window
+
+        Parameters
+        ----------
+        pending : PendingRequest
+            Pending request to forget
+
+        lost : bool
+            False when the request is abandoned while its response is still expected, e.g. a hedged request whose
+            twin was answered first, it is then neither a congestion signal nor a timeout
+        """
+        removed = False
+        with self.pending_lock:
+            if pending in self.backlog:
+                self.backlog.remove(pending)
+            queue = self.pending.get(pending.key)
+            if queue is not None and pending in queue:
+                queue.remove(pending)
+                removed = True
+                if not queue:
+                    self._drop_queue(pending.key)
+        if removed and lost and pending.sent_time is not None:
+            if not (pending.responses if isinstance(pending, GroupRequest) else pending.done()):
+                self.metrics.timed_out(pending.key[1], pending.address)
+                if not isinstance(pending, GroupRequest):
+                    self.round_trip_times.timed_out(pending.address)
+        # a request forgotten before its response is a lost frame, a congestion signal
+        self._release(pending, lost and not pending.done() and not isinstance(pending, GroupRequest))
+
+    def wait_response(self, address, request, timeout=None, deadline=None):
         """
         Entry point to send a service and then wait for the service response,
         can raise a timeout exception a StuCanPublicError or the response when successfull
@@ -385,29 +1292,214 @@ class StuCanPublicNode(CanNode):
         request : Request
             Request service object
 
+        timeout : float
+            Response timeout in seconds counted from the transmission of the frame, None to wait forever
+
+        deadline : float
+            Monotonic time at which the request is abandoned, even while still queued behind the congestion window,
+            None for no bound
+
         Returns
         -------
         Response
             Response object of the service
         """
-        request_class = type(request)
-        request_class.response_count = 1
-        with request_class.cv:
-            self.send_service(address, request)
-            return_value = request_class.cv.wait(timeout)
-            if not return_value:
-                raise Timeout()
-        if isinstance(request_class.response, StuCanPublicError):
-            raise request_class.response
-        return request_class.response
+        pending = self.submit(address, request)
+        try:
+            return pending.result(timeout, deadline)
+        except Timeout:
+            # a request abandoned at the deadline before its own timeout is not a lost frame
+            self.cancel(pending, lost=timeout is not None and pending.deadline(timeout) <= monotonic())
+            raise
+
+    def wait_group_responses(self, group_address, request, timeout, quorum=None):
+        """
+        Send a service to a multicast group address and collect the responses of every device of the group until
+        the quorum is reached or the timeout expires, can raise a timeout exception if no device answered
+
+        Parameters
+        ----------
+        group_address : int
+            Targeted group address, one of GROUP_DEVICE_IDS
+
+        request : Request
+            Request service object
+
+        timeout : float
+            Collecting time in seconds
+
+        quorum : int
+            Number of responses completing the request, None to collect until the timeout
+
+        Returns
+        -------
+        dict
+            Response object or StuCanPublicError, keyed by source address
+        """
+        pending = self.submit_group(group_address, request, quorum)
+        try:
+            return pending.result(timeout)
+        finally:
+            self.cancel(pending)
+
+    def wait_responses(self, requests, timeout=None, window=8, probe=False):
+        """
+        Send many services keeping at most `window` of them in flight and wait for all the responses. Each request
+        has its own timeout, counted from the transmission of its frame, so a slow or missing device does not stall
+        the others
 
-    def messages(self):
+        Parameters
+        ----------
+        requests : list
+            List of (address, request) tuples
+
+        timeout : float or callable
+            Response timeout of each request in seconds, None to wait forever. A callable is called with the address
+            of each request to get its timeout, e.g. `RoundTripTimes.timeout`
+
+        window : int
+            Maximum number of requests in flight at the same time
+
+        probe : bool
+            True for requests that may legitimately get no response, e.g. discovery probes of every address. They are
+            sent outside of the congestion window and their timeouts are neither congestion signals nor counted in
+            the metrics
+
+        Returns
+        -------
+        list
+            For each request, in the same order, the Response object or the raised exception (StuCanPublicError or
+            Timeout)
         """
-        Retreive the list of messages previously happened on the CAN bus
+        assert window >= 1
+        results = [None] * len(requests)
+        in_flight = {}
+        timeouts = {}
+        finished = []
+        cv = Condition()
+
+        def on_done(index):
+            def callback(pending):
+                with cv:
+                    finished.append(index)
+                    cv.notify()
+            return callback
+
+        next_index = 0
+        with cv:
+            while next_index < len(requests) or in_flight:
+                while next_index < len(requests) and len(in_flight) < window:
+                    address, request = requests[next_index]
+                    try:
+                        pending = self.submit(address, request, not probe)
+                    except Exception as exception:
+                        results[next_index] = exception
+                    else:
+                        in_flight[next_index] = pending
+                        timeouts[next_index] = timeout(address) if callable(timeout) else timeout
+                        pending.add_done_callback(on_done(next_index))
+                    next_index += 1
+                while finished:
+                    index = finished.pop()
+                    if index not in in_flight:
+                        continue
+                    pending = in_flight.pop(index)
+                    try:
+                        results[index] = pending.result(0)
+                    except (StuCanPublicError, Timeout) as exception:
+                        results[index] = exception
+                now = monotonic()
+                for index, pending in list(in_flight.items()):
+                    if timeouts[index] is not None and pending.deadline(timeouts[index]) <= now:
+                        self.cancel(pending, lost=not probe)
+                        del in_flight[index]
+                        results[index] = Timeout()
+                if len(in_flight) >= window or (next_index == len(requests) and in_flight):
+                    deadlines = [pending.deadline(timeouts[index]) for index, pending in in_flight.items()
+                                 if timeouts[index] is not None]
+                    if not deadlines:
+                        cv.wait()
+                    else:
+                        cv.wait(max(0, min(deadlines) - now))
+        return results
+
+    def messages(self, since=None):
+        """
+        Retreive the list of messages previously happened on the CAN bus, only the last `message_capacity` ones are
+        kept
+
+        Parameters
+        ----------
+        since : int
+            Sequence number of the last message already seen, when given only newer messages are returned along with
+            their sequence number
 
         Returns
         -------
         list
-            Notifications messages
+            Notifications messages as (source_address, message) tuples, or (sequence, source_address, message)
+            tuples when `since` is given
+        """
+        if since is None:
+            return [(source_address, message) for sequence, source_address, message in self.notifications.since()]
+        return self.notifications.since(since)
+
+    def stream_messages(self, since=None, timeout=None):
+        """
+        Generator yielding each message notification as soon as it is received, consumers wake up only when a
+        message arrives
+
+        Parameters
+        ----------
+        since : int
+            Sequence number of the last message already seen, default to only yield messages received from now on
+
+        timeout : float
+            Stop the iteration when no message arrives within this time in seconds, None to iterate until the node
+            stops
+
+        Yields
+        ------
+        tuple
+            (source_address, message)
+        """
+        sequence = self.notifications.sequence if since is None else since
+        while True:
+            entries = self.notifications.wait(sequence, timeout)
+            if not entries:
+                return
+            for sequence, source_address, message in entries:
+                yield source_address, message
+
+    def stop(self):
+        """
+        Method override, also end the message streams
+        """
+        CanNode.stop(self)
+        self.notifications.close()
+
+    def prometheus_metrics(self):
+        """
+        Export the node metrics in the Prometheus text exposition format, along with the congestion window, the
+        requests in flight or queued and the dropped messages
+
+        Returns
+        -------
+        string
+            Text to serve on a /metrics endpoint, every sample is labelled with the node address
+        """
+        with self.pending_lock:
+            gauges = {'xcomcan_congestion_window': (self.congestion.size, 'Congestion window size in requests'),
+                      'xcomcan_requests_in_flight': (self.congestion.in_flight, 'Requests waiting for a response'),
+                      'xcomcan_requests_queued': (len(self.backlog), 'Requests queued beyond the congestion window')}
+        gauges['xcomcan_dropped_messages'] = (self.notifications.dropped, 'Message notifications lost on overflow')
+        return self.metrics.prometheus({'node': self.address}, gauges)
+
+    def dropped_messages(self):
+        """
+        Returns
+        -------
+        int
+            Number of messages lost because the buffer was full
         """
-        return MessageNotification.messages
+        return self.notifications.dropped
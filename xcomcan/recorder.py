@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Columnar recording of polled values.
+
+:class:`TimeSeriesRecorder` stores (timestamp, address, object id, value) samples in preallocated typed arrays and
+appends them chunk by chunk to one file per column, no Python object is kept per sample. Files are split into
+segments of a bounded number of rows. :class:`TimeSeriesReader` memory-maps the segments so that long histories are
+sliced by time without being loaded into memory.
+
+The recorder is fed with the `callback` of :class:`xcomcan.scheduler.PollingScheduler`, the samples must be recorded
+in time order.
+"""
+
+import json
+import logging
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:  # optional dependency, series() falls back on a Python loop
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (('timestamp', 'd'), ('address', 'H'), ('object_id', 'H'), ('value', 'f'))
+"""
+Name and array type code of the recorded columns: POSIX timestamp as float64, device address and object id as uint16
+and value as float32, the type of the values on the CAN bus
+"""
+
+FORMAT_VERSION = 1
+"""
+Version of the recording format, recordings of another version are not read
+"""
+
+METADATA_FILE = 'recording.json'
+
+
+def _segment_path(directory, index):
+    return os.path.join(directory, 'segment-{:06d}'.format(index))
+
+
+def _column_path(segment_path, name):
+    return os.path.join(segment_path, name + '.col')
+
+
+def _segment_indexes(directory):
+    indexes = []
+    for name in os.listdir(directory):
+        if name.startswith('segment-') and name[len('segment-'):].isdigit():
+            indexes.append(int(name[len('segment-'):]))
+    return sorted(indexes)
+
+
+def _segment_rows(segment_path):
+    # columns are appended one after the other, a row is complete once it is in every column
+    rows = None
+    for name, typecode in COLUMNS:
+        try:
+            size = os.path.getsize(_column_path(segment_path, name))
+        except FileNotFoundError:
+            size = 0
+        count = size // array(typecode).itemsize
+        rows = count if rows is None else min(rows, count)
+    return rows
+
+
+def _check_metadata(directory):
+    with open(os.path.join(directory, METADATA_FILE), encoding='utf-8') as f:
+        metadata = json.load(f)
+    if metadata.get('version') != FORMAT_VERSION:
+        raise ValueError('unsupported recording version {}'.format(metadata.get('version')))
+    if metadata.get('byteorder') != sys.byteorder:
+        raise ValueError('recording written with {} byte order'.format(metadata.get('byteorder')))
+    return metadata
+
+
+class TimeSeriesRecorder:
+    """
+    Class representing an append-only columnar recording of polled values
+
+    Attributes
+    ----------
+    directory : string
+        Location of the recording
+    rows : int
+        Number of samples recorded, including the ones of a previous run
+    skipped : int
+        Number of failed reads not recorded
+    """
+
+    def __init__(self, directory, chunk_rows=4096, segment_rows=1 << 22):
+        """
+        Parameters
+        ----------
+        directory : string
+            Location of the recording, created if missing. Recording goes on after the samples already present
+
+        chunk_rows : int
+            Number of samples buffered in memory before being appended to the files
+
+        segment_rows : int
+            Number of samples per segment, a new set of column files is started when a segment is full
+
+        Example
+        -------
+        .. code-block:: python
+
+            plan = [(XT_1_DEVICE_ID, 3000, 1), (XT_1_DEVICE_ID, 3136, 1)]
+            with StuCanPublicClient(0x00, CAN_BUS_SPEED, bustype='kvaser') as client, \\
+                    TimeSeriesRecorder('history') as recorder:
+                scheduler = PollingScheduler(client, plan, callback=recorder.record)
+                scheduler.start()
+                ...
+        """
+        assert 1 <= chunk_rows <= segment_rows
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.segment_rows = segment_rows
+        self.lock = Lock()
+        self.buffers = {name: array(typecode, bytes(array(typecode).itemsize * chunk_rows))
+                        for name, typecode in COLUMNS}
+        self.buffered = 0
+        self.skipped = 0
+        os.makedirs(directory, exist_ok=True)
+        metadata_path = os.path.join(directory, METADATA_FILE)
+        if os.path.exists(metadata_path):
+            _check_metadata(directory)
+        else:
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': FORMAT_VERSION, 'byteorder': sys.byteorder,
+                           'columns': [list(column) for column in COLUMNS]}, f)
+        indexes = _segment_indexes(directory)
+        self.segment = indexes[-1] if indexes else 0
+        self.rows = sum(_segment_rows(_segment_path(directory, index)) for index in indexes)
+        self.segment_used = self._repair(_segment_path(directory, self.segment))
+
+    def _repair(self, segment_path):
+        """
+        Cut the columns of a segment to the last complete row, a crash may have left a partial chunk
+        """
+        os.makedirs(segment_path, exist_ok=True)
+        rows = _segment_rows(segment_path)
+        for name, typecode in COLUMNS:
+            path = _column_path(segment_path, name)
+            with open(path, 'ab') as f:
+                f.truncate(rows * array(typecode).itemsize)
+        return rows
+
+    def record(self, address, object_id, value, timestamp):
+        """
+        Record a sample, same signature as the callback of PollingScheduler. Failed reads (StuCanPublicError or
+        Timeout values) are counted in `skipped` and not recorded
+
+        Parameters
+        ----------
+        address : int
+            Device address
+
+        object_id : int
+            User Info or Parameter id number
+
+        value : float
+            Value read
+
+        timestamp : float
+            POSIX timestamp of the sample
+        """
+        if isinstance(value, Exception):
+            self.skipped += 1
+            return
+        with self.lock:
+            index = self.buffered
+            buffers = self.buffers
+            buffers['timestamp'][index] = timestamp
+            buffers['address'][index] = address
+            buffers['object_id'][index] = object_id
+            buffers['value'][index] = value
+            self.buffered = index + 1
+            if self.buffered == self.chunk_rows:
+                self._write()
+
+    def flush(self):
+        """
+        Append the buffered samples to the files
+        """
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        written = 0
+        while written < self.buffered:
+            if self.segment_used == self.segment_rows:
+                self.segment += 1
+                self.segment_used = self._repair(_segment_path(self.directory, self.segment))
+            count = min(self.buffered - written, self.segment_rows - self.segment_used)
+            segment_path = _segment_path(self.directory, self.segment)
+            for name, typecode in COLUMNS:
+                with open(_column_path(segment_path, name), 'ab') as f:
+                    f.write(memoryview(self.buffers[name])[written:written + count])
+            written += count
+            self.segment_used += count
+            self.rows += count
+        self.buffered = 0
+
+    def close(self):
+        """
+        Append the buffered samples to the files, the recorder can still be used afterwards
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TimeSeriesReader:
+    """
+    Class representing a read-only memory-mapped view of a recording, samples appended after the reader was opened
+    are visible after `refresh`
+
+    Attributes
+    ----------
+    directory : string
+        Location of the recording
+    """
+
+    def __init__(self, directory):
+        """
+        Parameters
+        ----------
+        directory : string
+            Location of a recording written by TimeSeriesRecorder
+
+        Example
+        -------
+        .. code-block:: python
+
+            with TimeSeriesReader('history') as reader:
+                timestamps, values = reader.series(XT_1_DEVICE_ID, 3000, start=time() - 86400)
+        """
+        self.directory = directory
+        _check_metadata(directory)
+        self.maps = []
+        self.segments = []
+        self.refresh()
+
+    def refresh(self):
+        """
+        Map the segments again to see the samples recorded since the reader was opened
+        """
+        self.close()
+        for index in _segment_indexes(self.directory):
+            segment_path = _segment_path(self.directory, index)
+            rows = _segment_rows(segment_path)
+            if rows == 0:
+                continue
+            columns = {}
+            for name, typecode in COLUMNS:
+                with open(_column_path(segment_path, name), 'rb') as f:
+                    column_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.maps.append(column_map)
+                columns[name] = memoryview(column_map).cast('B')[:rows * array(typecode).itemsize].cast(typecode)
+            self.segments.append(columns)
+
+    def __len__(self):
+        return sum(len(columns['timestamp']) for columns in self.segments)
+
+    def columns(self, start=None, end=None):
+        """
+        Retreive the samples recorded between two times without copying them
+
+        Parameters
+        ----------
+        start : float
+            POSIX timestamp of the first sample, None from the beginning
+
+        end : float
+            POSIX timestamp the samples are older than, None up to the last sample
+
+        Returns
+        -------
+        list
+            One dictionary per segment holding the 'timestamp', 'address', 'object_id' and 'value' columns as
+            memoryview slices of the mapped files, they can be converted with `numpy.asarray` or `list`
+        """
+        selection = []
+        for columns in self.segments:
+            timestamps = columns['timestamp']
+            if (start is not None and timestamps[-1] < start) or (end is not None and timestamps[0] >= end):
+                continue
+            first = 0 if start is None else bisect_left(timestamps, start)
+            last = len(timestamps) if end is None else bisect_left(timestamps, end)
+            if first < last:
+                selection.append({name: column[first:last] for name, column in columns.items()})
+        return selection
+
+    def series(self, address, object_id, start=None, end=None):
+        """
+        Retreive the values of one object between two times, the samples are filtered with vectorized operations
+        when NumPy is installed
+
+        Parameters
+        ----------
+        address : int
+            Device address
+
+        object_id : int
+            User Info or Parameter id number
+
+        start : float
+            POSIX timestamp of the first sample, None from the beginning
+
+        end : float
+            POSIX timestamp the samples are older than, None up to the last sample
+
+        Returns
+        -------
+        tuple
+            (timestamps, values) arrays of the matching samples
+        """
+        timestamps = array('d')
+        values = array('f')
+        for columns in self.columns(start, end):
+            column_timestamps, column_values = columns['timestamp'], columns['value']
+            if numpy is not None:
+                mask = (numpy.frombuffer(columns['address'], 'H') == address) & \
+                    (numpy.frombuffer(columns['object_id'], 'H') == object_id)
+                timestamps.frombytes(numpy.frombuffer(column_timestamps, 'd')[mask].tobytes())
+                values.frombytes(numpy.frombuffer(column_values, 'f')[mask].tobytes())
+                continue
+            for index, (sample_address, sample_object_id) in enumerate(zip(columns['address'], columns['object_id'])):
+                if sample_address == address and sample_object_id == object_id:
+                    timestamps.append(column_timestamps[index])
+                    values.append(column_values[index])
+        return timestamps, values
+
+    def close(self):
+        """
+        Unmap the segments, memoryviews returned by `columns` must have been released
+        """
+        for columns in self.segments:
+            for column in columns.values():
+                column.release()
+        self.segments = []
+        for column_map in self.maps:
+            try:
+                column_map.close()
+            except BufferError:
+                # still exported by a slice held by the caller, unmapped when the slice is collected
+                logger.debug('segment of %s still in use', self.directory)
+        self.maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Retry of the requests failing for a transient reason.
+
+A :class:`RetryPolicy` given to :class:`xcomcan.client.StuCanPublicClient` retries the requests that failed with an
+error identifier safe to retry or that got no response, with a jittered exponential backoff, until an overall
+deadline. Reads are idempotent and can also be hedged: when the response is late compared to the latencies observed
+so far, the same request is sent once more and the first response wins.
+
+Writes are only retried when the error proves the request has not been executed (GATEWAY_BUSY, the gateway did not
+forward it), a write which got no response may have been applied and is never sent again.
+"""
+
+import random
+from threading import Event
+from time import monotonic, sleep
+from stucancommon.node import Timeout
+from .node import StuCanPublicError, error_identifier_dictionary
+
+RETRY_IDENTIFIERS = ('RESPONSE_TIMEOUT', 'GATEWAY_BUSY')
+"""
+Error identifiers retried by default, the gateway or the device was too busy to answer
+"""
+
+WRITE_RETRY_IDENTIFIERS = ('GATEWAY_BUSY',)
+"""
+Error identifiers after which a write can be sent again, the request never reached the device
+"""
+
+
+class RetryPolicy:
+    """
+    Class representing how the requests of a client are retried
+
+    Attributes
+    ----------
+    retries : int
+        Number of requests sent again
+    hedges : int
+        Number of hedged reads sent
+    """
+
+    def __init__(self, deadline=3.0, attempts=3, retry_identifiers=RETRY_IDENTIFIERS, retry_timeouts=True,
+                 backoff=0.02, max_backoff=0.5, hedge_quantile=None, seed=None):
+        """
+        Parameters
+        ----------
+        deadline : float
+            Overall time in seconds allowed to a call, retries included
+
+        attempts : int
+            Maximum number of times a request is sent, hedged reads are not counted
+
+        retry_identifiers : tuple
+            Error identifiers of `error_identifier_dictionary` retried, writes are only retried on the ones of
+            WRITE_RETRY_IDENTIFIERS
+
+        retry_timeouts : bool
+            Retry the reads which got no response
+
+        backoff : float
+            Upper bound in seconds of the delay before the first retry, doubled at each retry, the delay is drawn
+            uniformly between 0 and the bound
+
+        max_backoff : float
+            Maximum upper bound in seconds of the delay before a retry
+
+        hedge_quantile : float
+            When given, e.g. 0.95, a read still unanswered after this quantile of the response times observed for
+            the service and device is sent once more. None disables hedging
+
+        seed : int
+            Seed of the backoff random generator, for reproducible runs
+
+        Example
+        -------
+        .. code-block:: python
+
+            retry = RetryPolicy(deadline=2, hedge_quantile=0.95)
+            with StuCanPublicClient(0x00, CAN_BUS_SPEED, bustype='kvaser', retry=retry) as client:
+                print(client.read_user_info(XT_1_DEVICE_ID, 3000))
+        """
+        assert attempts >= 1
+        assert hedge_quantile is None or 0 < hedge_quantile < 1
+        unknown = set(retry_identifiers) - set(error_identifier_dictionary.values())
+        assert not unknown, 'unknown error identifiers {}'.format(unknown)
+        self.deadline = deadline
+        self.attempts = attempts
+        self.retry_identifiers = frozenset(retry_identifiers)
+        self.retry_timeouts = retry_timeouts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_quantile = hedge_quantile
+        self.random = random.Random(seed)
+        self.retries = 0
+        self.hedges = 0
+
+    def retryable(self, exception, idempotent):
+        """
+        Parameters
+        ----------
+        exception : Exception
+            StuCanPublicError or Timeout raised by a request
+
+        idempotent : bool
+            True for a read, False for a write
+
+        Returns
+        -------
+        bool
+            True if the request can be sent again
+        """
+        if isinstance(exception, StuCanPublicError):
+            if not idempotent and exception.identifier not in WRITE_RETRY_IDENTIFIERS:
+                return False
+            return exception.identifier in self.retry_identifiers
+        if isinstance(exception, Timeout):
+            return idempotent and self.retry_timeouts
+        return False
+
+    def delay(self, attempt):
+        """
+        Parameters
+        ----------
+        attempt : int
+            Number of times the request has been sent
+
+        Returns
+        -------
+        float
+            Seconds to wait before sending the request again, full jitter
+        """
+        return self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def call(self, node, address, request, timeout, idempotent):
+        """
+        Send a request and wait for its response, retrying it according to the policy
+
+        Parameters
+        ----------
+        node : StuCanPublicNode
+            Running node
+
+        address : int
+            Targeted device address
+
+        request : Request
+            Request service object
+
+        timeout : float
+            Response timeout of each attempt counted from the transmission of its frame, the attempts still queued
+            behind the congestion window or unanswered at the deadline are abandoned
+
+        idempotent : bool
+            True for a read, which can be retried after a timeout and hedged
+
+        Returns
+        -------
+        Response
+            Response object of the service
+        """
+        deadline = monotonic() + self.deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if idempotent and self.hedge_quantile is not None:
+                    return self._hedged(node, address, request, timeout, deadline)
+                return node.wait_response(address, request, timeout, deadline)
+            except (StuCanPublicError, Timeout) as exception:
+                if attempt >= self.attempts or not self.retryable(exception, idempotent):
+                    raise
+                delay = self.delay(attempt)
+                if monotonic() + delay >= deadline:
+                    raise
+            sleep(delay)
+            self.retries += 1
+
+    def wait_responses(self, node, requests, timeout, window):
+        """
+        Send many reads keeping at most `window` of them in flight, then send again the ones that failed for a
+        reason safe to retry, until they all succeeded or the policy gives up
+
+        Parameters
+        ----------
+        node : StuCanPublicNode
+            Running node
+
+        requests : list
+            List of (address, request) tuples of idempotent requests
+
+        timeout : float or callable
+            Response timeout of each request, refer to `StuCanPublicNode.wait_responses`
+
+        window : int
+            Maximum number of requests in flight at the same time
+
+        Returns
+        -------
+        list
+            For each request, in the same order, the Response object or the raised exception
+        """
+        deadline = monotonic() + self.deadline
+        results = node.wait_responses(requests, timeout, window)
+        for attempt in range(1, self.attempts):
+            failed = [index for index, result in enumerate(results) if self.retryable(result, True)]
+            delay = self.delay(attempt)
+            if not failed or monotonic() + delay >= deadline:
+                break
+            sleep(delay)
+            self.retries += len(failed)
+            for index, result in zip(failed, node.wait_responses([requests[index] for index in failed], timeout,
+                                                                 window)):
+                results[index] = result
+        return results
+
+    def _hedged(self, node, address, request, timeout, deadline):
+        hedge_delay = node.metrics.latency_quantile(request.SERVICE_ID, address, self.hedge_quantile)
+        if hedge_delay is None or hedge_delay >= timeout:
+            return node.wait_response(address, request, timeout, deadline)
+        primary = node.submit(address, request)
+        pendings = [primary]
+        try:
+            if not primary.wait(hedge_delay, deadline):
+                answered = Event()
+                primary.add_done_callback(lambda pending: answered.set())
+                hedge = node.submit(address, request)
+                pendings.append(hedge)
+                self.hedges += 1
+                hedge.add_done_callback(lambda pending: answered.set())
+                answered.wait(max(0.0, min(primary.deadline(timeout), deadline) - monotonic()))
+            for pending in pendings:
+                if pending.done():
+                    return pending.result(0)
+            raise Timeout()
+        finally:
+            answered = any(pending.done() for pending in pendings)
+            for pending in pendings:
+                if not pending.done():
+                    # the twin of an answered request is not lost, its response is only late
+                    node.cancel(pending, lost=not answered)
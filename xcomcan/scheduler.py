@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Periodic polling of User Infos at per-point rates.
+
+Each entry of the polling plan is read every `period` seconds. First reads are staggered over the period so that
+points sharing the same rate are spread evenly in time instead of being sent in bursts.
+"""
+
+import heapq
+import logging
+from threading import Thread, Condition
+from time import monotonic, time
+from stucancommon.node import Timeout
+from .node import ReadUserInfoRequest, StuCanPublicError
+
+logger = logging.getLogger(__name__)
+
+
+class PollingScheduler(Thread):
+    """
+    Thread polling User Infos according to a polling plan, results are delivered to a callback and/or a queue
+
+    Attributes
+    ----------
+    plan : list
+        List of (address, info_id, period) tuples
+    isRunning : boolean
+        state of the scheduler
+    """
+
+    def __init__(self, client, plan, callback=None, queue=None, timeout=None, window=8):
+        """
+        Parameters
+        ----------
+        client : StuCanPublicClient
+            Client already entered with the with statement
+
+        plan : list
+            List of (address, info_id, period) tuples, period in seconds
+
+        callback : callable
+            Called from the scheduler thread as callback(address, info_id, value, timestamp), value being the
+            StuCanPublicError or Timeout raised when the read failed
+
+        queue : queue.Queue
+            Receives (address, info_id, value, timestamp) tuples, same content as the callback
+
+        timeout : float
+            Response timeout of each read, default to the one given by `client.request_timeout`
+
+        window : int
+            Maximum number of requests in flight at the same time, default to 8
+
+        Example
+        -------
+        .. code-block:: python
+
+            plan = [(XT_1_DEVICE_ID, 3136, 0.2), (XT_1_DEVICE_ID, 3000, 1), (XT_1_DEVICE_ID, 3032, 30)]
+            with StuCanPublicClient(0x00, CAN_BUS_SPEED, bustype='kvaser') as client:
+                scheduler = PollingScheduler(client, plan, callback=print)
+                scheduler.start()
+                ...
+                print(scheduler.lag())
+                scheduler.stop()
+                scheduler.join()
+        """
+        Thread.__init__(self, daemon=True)
+        assert window >= 1
+        assert all(period > 0 for address, info_id, period in plan)
+        self.client = client
+        self.plan = list(plan)
+        self.callback = callback
+        self.queue = queue
+        self.timeout = timeout
+        self.window = window
+        self.isRunning = True
+        self.cv = Condition()
+        self.completed = []
+        self.last_success = {}
+        self.missed = {}
+        self.started = monotonic()
+
+    def stop(self):
+        """
+        Set PollingScheduler.isRunning to False and wake up the scheduler thread
+        """
+        with self.cv:
+            self.isRunning = False
+            self.cv.notify()
+
+    def lag(self):
+        """
+        Retreive how far each point is running behind its target period
+
+        Returns
+        -------
+        dict
+            Seconds elapsed since the last successful value minus the period (0 when on time), keyed by
+            (address, info_id). Points that never succeeded are measured from the scheduler start
+        """
+        now = monotonic()
+        with self.cv:
+            return {(address, info_id): max(0.0, now - self.last_success.get(index, self.started) - period)
+                    for index, (address, info_id, period) in enumerate(self.plan)}
+
+    def missed_polls(self):
+        """
+        Retreive the number of polls skipped because the previous read of the same point was still in flight
+
+        Returns
+        -------
+        dict
+            Number of skipped polls keyed by (address, info_id)
+        """
+        with self.cv:
+            return {(address, info_id): self.missed.get(index, 0)
+                    for index, (address, info_id, period) in enumerate(self.plan)}
+
+    def run(self):
+        """
+        Override method from Thread to send the reads when they are due and deliver their results
+        """
+        self.started = monotonic()
+        count = len(self.plan)
+        schedule = [(self.started + period * index / count, index)
+                    for index, (address, info_id, period) in enumerate(self.plan)]
+        heapq.heapify(schedule)
+        in_flight = {}
+        while True:
+            outbox = []
+            with self.cv:
+                if not self.isRunning:
+                    break
+                self._deliver(in_flight, outbox)
+                now = monotonic()
+                for index, pending in list(in_flight.items()):
+                    if pending.sent_time is not None and pending.deadline(self._timeout(pending)) <= now:
+                        self.client.node.cancel(pending)
+                        del in_flight[index]
+                        outbox.append((index, Timeout()))
+                while schedule and schedule[0][0] <= now and len(in_flight) < self.window:
+                    due, index = heapq.heappop(schedule)
+                    address, info_id, period = self.plan[index]
+                    if index in in_flight:
+                        self.missed[index] = self.missed.get(index, 0) + 1
+                    else:
+                        self._send(index, in_flight)
+                    # never schedule in the past, missed periods are not sent in a burst
+                    due += period
+                    if due <= now:
+                        due += period * ((now - due) // period + 1)
+                    heapq.heappush(schedule, (due, index))
+                wake_times = [pending.deadline(self._timeout(pending)) for pending in in_flight.values()]
+                if schedule and len(in_flight) < self.window:
+                    wake_times.append(schedule[0][0])
+                if not outbox and not self.completed:
+                    self.cv.wait(max(0.0, min(wake_times) - monotonic()) if wake_times else None)
+            # results are published without holding the lock, the receiving thread is never blocked by a callback
+            for index, value in outbox:
+                self._publish(index, value)
+        for pending in in_flight.values():
+            self.client.node.cancel(pending)
+
+    def _timeout(self, pending):
+        return self.client.request_timeout(pending.address, self.timeout)
+
+    def _send(self, index, in_flight):
+        address, info_id, period = self.plan[index]
+
+        def on_done(pending):
+            with self.cv:
+                self.completed.append(index)
+                self.cv.notify()
+
+        try:
+            pending = self.client.node.submit(address, ReadUserInfoRequest(info_id))
+        except Exception as exception:
+            logger.warning('polling of user info %d on address %d failed: %r', info_id, address, exception)
+            return
+        in_flight[index] = pending
+        pending.add_done_callback(on_done)
+
+    def _deliver(self, in_flight, outbox):
+        while self.completed:
+            index = self.completed.pop(0)
+            if index not in in_flight:
+                continue
+            pending = in_flight.pop(index)
+            try:
+                value = pending.result(0).value
+            except (StuCanPublicError, Timeout) as exception:
+                value = exception
+            else:
+                self.last_success[index] = monotonic()
+            outbox.append((index, value))
+
+    def _publish(self, index, value):
+        address, info_id, period = self.plan[index]
+        timestamp = time()
+        if self.queue is not None:
+            self.queue.put((address, info_id, value, timestamp))
+        if self.callback is not None:
+            try:
+                self.callback(address, info_id, value, timestamp)
+            except Exception:
+                logger.exception('polling callback failed')
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+In-process simulation of an Xcom-CAN installation.
+
+:class:`SimulatedInstallation` implements the driver interface of `PythonCanDriver` (`send` and `receive`), it can
+be handed to :class:`xcomcan.client.StuCanPublicClient` with the `driver` argument to exercise the client without
+any CAN hardware. Devices answer the Read User Info, Read Parameter and Write Parameter services, including the
+multicast group addresses, after a configurable latency. GATEWAY_BUSY errors, lost frames and spontaneous message
+notifications can be injected.
+"""
+
+import heapq
+import random
+from struct import Struct
+from threading import Condition
+from time import monotonic, time
+from .addresses import PARAMETER_PART_FLASH, PARAMETER_PART_FLASH_MIN, PARAMETER_PART_FLASH_MAX
+from .addresses import PARAMETER_PART_RAM
+from .addresses import RCC_GROUP_DEVICE_ID
+from .node import group_of, ERROR_STRUCT
+
+OBJECT_ID_STRUCT = Struct('>H')
+USER_INFO_STRUCT = Struct('>Hf')
+READ_PARAMETER_STRUCT = Struct('>HB')
+PARAMETER_STRUCT = Struct('>HBf')
+MESSAGE_STRUCT = Struct('>HI')
+
+
+class SimulatedDevice:
+    """
+    Class representing a simulated Xtender, VarioTrack, VarioString or BSP
+
+    Attributes
+    ----------
+    address : int
+        Unicast device address, e.g. XT_1_DEVICE_ID
+    user_infos : dict
+        User Info values keyed by id, they can be changed at any time to simulate the installation
+    parameters : dict
+        Parameter values keyed by id, as dictionaries keyed by part
+    """
+
+    def __init__(self, address, user_infos=None, parameters=None, latency=0.005, jitter=0.0):
+        """
+        Parameters
+        ----------
+        address : int
+            Unicast device address, e.g. XT_1_DEVICE_ID
+
+        user_infos : dict
+            User Info values keyed by id
+
+        parameters : dict
+            Parameter values keyed by id, either a float (no limits) or a (value, minimum, maximum) tuple
+
+        latency : float
+            Response time in seconds
+
+        jitter : float
+            Random additional response time in seconds, uniformly distributed between 0 and jitter
+        """
+        assert group_of(address) is not None and group_of(address) != address
+        self.address = address
+        self.user_infos = dict(user_infos or {})
+        self.parameters = {}
+        for parameter_id, value in (parameters or {}).items():
+            value, minimum, maximum = value if isinstance(value, tuple) else (value, float('-inf'), float('inf'))
+            self.parameters[parameter_id] = {PARAMETER_PART_FLASH: value, PARAMETER_PART_RAM: value,
+                                             PARAMETER_PART_FLASH_MIN: minimum, PARAMETER_PART_FLASH_MAX: maximum}
+        self.latency = latency
+        self.jitter = jitter
+        self.flash_writes = 0
+
+    def read_user_info(self, info_id):
+        """
+        Returns
+        -------
+        tuple
+            (error_code, value), error_code being None on success
+        """
+        if info_id not in self.user_infos:
+            return 0x22, None
+        return None, self.user_infos[info_id]
+
+    def read_parameter(self, parameter_id, part):
+        """
+        Like the real devices, reading PARAMETER_PART_RAM returns the flash value, the RAM value is only visible in
+        the `parameters` attribute
+
+        Returns
+        -------
+        tuple
+            (error_code, value), error_code being None on success
+        """
+        if parameter_id not in self.parameters:
+            return 0x22, None
+        if part not in self.parameters[parameter_id]:
+            return 0x12, None
+        if part == PARAMETER_PART_RAM:
+            part = PARAMETER_PART_FLASH
+        return None, self.parameters[parameter_id][part]
+
+    def write_parameter(self, parameter_id, part, value):
+        """
+        Returns
+        -------
+        tuple
+            (error_code, value), error_code being None on success
+        """
+        if parameter_id not in self.parameters:
+            return 0x22, None
+        if part not in (PARAMETER_PART_FLASH, PARAMETER_PART_RAM):
+            return 0x12, None
+        parts = self.parameters[parameter_id]
+        if value < parts[PARAMETER_PART_FLASH_MIN]:
+            return 0x27, None
+        if value > parts[PARAMETER_PART_FLASH_MAX]:
+            return 0x28, None
+        parts[PARAMETER_PART_RAM] = value
+        if part == PARAMETER_PART_FLASH:
+            parts[PARAMETER_PART_FLASH] = value
+            self.flash_writes += 1
+        return None, value
+
+
+class SimulatedInstallation:
+    """
+    Class representing a simulated Xcom-CAN gateway and its devices, usable as driver of a `StuCanPublicNode`
+
+    Attributes
+    ----------
+    devices : dict
+        SimulatedDevice keyed by address
+    sent : int
+        Number of frames sent by the client
+    busy : int
+        Number of GATEWAY_BUSY errors injected
+    dropped : int
+        Number of frames lost on purpose
+    """
+
+    def __init__(self, devices, gateway_capacity=None, busy_probability=0.0, drop_probability=0.0,
+                 notification_rate=0.0, notification_ids=(0,), seed=None):
+        """
+        Parameters
+        ----------
+        devices : list
+            SimulatedDevice of the installation
+
+        gateway_capacity : int
+            Number of requests the gateway processes at the same time, further requests are answered with
+            GATEWAY_BUSY, None for unlimited
+
+        busy_probability : float
+            Probability to answer a request with GATEWAY_BUSY
+
+        drop_probability : float
+            Probability to never answer a request, the client then times out
+
+        notification_rate : float
+            Mean number of spontaneous message notifications per second, sent by random devices
+
+        notification_ids : tuple
+            Message ids picked for the spontaneous notifications
+
+        seed : int
+            Seed of the random generator, for reproducible runs
+
+        Example
+        -------
+        .. code-block:: python
+
+            installation = SimulatedInstallation([SimulatedDevice(XT_1_DEVICE_ID, {3000: 48.5}, {1286: 230.0})],
+                                                 gateway_capacity=4)
+            with StuCanPublicClient(0x00, driver=installation) as client:
+                print(client.read_user_info(XT_1_DEVICE_ID, 3000))
+        """
+        self.devices = {device.address: device for device in devices}
+        self.gateway_capacity = gateway_capacity
+        self.busy_probability = busy_probability
+        self.drop_probability = drop_probability
+        self.notification_rate = notification_rate
+        self.notification_ids = tuple(notification_ids)
+        self.random = random.Random(seed)
+        self.cv = Condition()
+        self.frames = []
+        self.counter = 0
+        self.processing = []
+        self.sent = 0
+        self.busy = 0
+        self.dropped = 0
+        self.next_notification = self._next_notification(monotonic())
+
+    def send(self, identifier, data, is_extended_id=False):
+        """
+        Driver interface, receive a frame sent by the client and schedule the responses
+
+        Parameters
+        ----------
+        identifier : int
+            The frame identifier
+
+        data : bytes
+            The data of the frame
+
+        is_extended_id : bool
+            Must be True, the StuCan public protocol uses CAN2.0B frames
+        """
+        assert is_extended_id
+        destination_address = (identifier >> 19) & 0x3FF
+        source_address = (identifier >> 9) & 0x3FF
+        service_id = (identifier >> 6) & 0x7
+        data = bytes(data)
+        now = monotonic()
+        with self.cv:
+            self.sent += 1
+            self.processing = [end for end in self.processing if end > now]
+            if self.random.random() < self.drop_probability:
+                self.dropped += 1
+                return
+            if destination_address in self.devices:
+                devices = [self.devices[destination_address]]
+            else:
+                devices = [device for device in self.devices.values() if group_of(device.address) ==
+                           destination_address]
+            if not devices:
+                object_id, = OBJECT_ID_STRUCT.unpack_from(data + bytes(2))
+                self._error(now, destination_address, source_address, service_id, object_id, 0x02)
+                return
+            if (self.gateway_capacity is not None and len(self.processing) >= self.gateway_capacity) or \
+                    self.random.random() < self.busy_probability:
+                self.busy += 1
+                object_id, = OBJECT_ID_STRUCT.unpack_from(data + bytes(2))
+                self._error(now, destination_address, source_address, service_id, object_id, 0x13)
+                return
+            for device in devices:
+                delay = device.latency + self.random.uniform(0, device.jitter)
+                self.processing.append(now + delay)
+                self._process(now + delay, device, source_address, service_id, data)
+
+    def _process(self, due, device, source_address, service_id, data):
+        if service_id == 0x0:
+            object_id, = OBJECT_ID_STRUCT.unpack_from(data + bytes(2))
+            error_code, value = device.read_user_info(object_id)
+            payload = USER_INFO_STRUCT.pack(object_id, value) if error_code is None else None
+        elif service_id == 0x1:
+            object_id, part = READ_PARAMETER_STRUCT.unpack_from(data)
+            error_code, value = device.read_parameter(object_id, part)
+            payload = PARAMETER_STRUCT.pack(object_id, part, value) if error_code is None else None
+        elif service_id == 0x2:
+            object_id, part, value = PARAMETER_STRUCT.unpack_from(data)
+            error_code, value = device.write_parameter(object_id, part, value)
+            payload = PARAMETER_STRUCT.pack(object_id, part, value) if error_code is None else None
+        else:
+            object_id, error_code, payload = 0, 0x01, None
+        if error_code is not None:
+            self._error(due, device.address, source_address, service_id, object_id, error_code)
+        else:
+            self._schedule(due, (source_address << 19) + (device.address << 9) + (service_id << 6), payload)
+
+    def _error(self, due, address, source_address, service_id, object_id, error_code):
+        identifier = (source_address << 19) + (address << 9) + (service_id << 6) + 0x1
+        self._schedule(due, identifier, ERROR_STRUCT.pack(object_id, error_code))
+
+    def _schedule(self, due, identifier, data):
+        self.counter += 1
+        heapq.heappush(self.frames, (due, self.counter, identifier, data))
+        self.cv.notify()
+
+    def _next_notification(self, now):
+        if self.notification_rate <= 0 or not self.devices:
+            return float('inf')
+        return now + self.random.expovariate(self.notification_rate)
+
+    def notify(self, source_address, message_id, value=0, destination_address=RCC_GROUP_DEVICE_ID):
+        """
+        Inject a message notification from a device
+
+        Parameters
+        ----------
+        source_address : int
+            Address of the device sending the message
+
+        message_id : int
+            Message id number
+
+        value : int
+            Message value
+
+        destination_address : int
+            Address of the client, default to every RCC-like device
+        """
+        with self.cv:
+            identifier = (destination_address << 19) + (source_address << 9) + (0x3 << 6)
+            self._schedule(monotonic(), identifier, MESSAGE_STRUCT.pack(message_id, value))
+
+    def receive(self, timeout=100):
+        """
+        Driver interface, wait for the next frame sent by the installation
+
+        Parameters
+        ----------
+        timeout : float
+            milli seconds to wait for a frame (default 100ms)
+
+        Returns
+        -------
+        tuple
+            identifier, data, dlc, flag, timestamp
+        """
+        deadline = monotonic() + timeout / 1000
+        with self.cv:
+            while True:
+                now = monotonic()
+                if self.next_notification <= now:
+                    source_address = self.random.choice(list(self.devices))
+                    self.next_notification = self._next_notification(now)
+                    identifier = (RCC_GROUP_DEVICE_ID << 19) + (source_address << 9) + (0x3 << 6)
+                    message_id = self.random.choice(self.notification_ids)
+                    self._schedule(now, identifier, MESSAGE_STRUCT.pack(message_id, 0))
+                if self.frames and self.frames[0][0] <= now:
+                    due, counter, identifier, data = heapq.heappop(self.frames)
+                    return identifier, data, len(data), None, time()
+                if now >= deadline:
+                    return None, None, None, None, None
+                wake = min(deadline, self.next_notification, self.frames[0][0] if self.frames else deadline)
+                self.cv.wait(max(0, wake - now))
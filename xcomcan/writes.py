@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Coalescing of Parameter writes.
+
+Control loops tend to write the same setpoint again and again, or to change it several times before the previous
+write is acknowledged. :class:`WriteCoalescer` drops the writes of a value equal to the last one confirmed by the
+device and, while a write of an (address, parameter_id, part) is in flight, merges the following writes into a single
+one carrying the last value. It saves bus bandwidth and, for `PARAMETER_PART_FLASH`, the flash endurance of the
+devices.
+
+The confirmed values are only known to this client: after the value has been changed by another way (RCC, another
+client, device reset) call :meth:`WriteCoalescer.forget` or the next write of the same value is dropped.
+"""
+
+from struct import Struct
+from threading import Condition
+from .addresses import PARAMETER_PART_FLASH, PARAMETER_PART_RAM
+from .node import group_of
+
+FLOAT_STRUCT = Struct('>f')
+
+
+def as_float32(value):
+    """
+    Round a value as it is transmitted in a frame, the written values are compared once rounded
+
+    Parameters
+    ----------
+    value : float
+        Parameter value
+
+    Returns
+    -------
+    float
+        Nearest float32 value
+    """
+    return FLOAT_STRUCT.unpack(FLOAT_STRUCT.pack(value))[0]
+
+
+class _WriteBatch:
+    """
+    Writes of the same Parameter merged into a single frame, the last value wins
+    """
+
+    __slots__ = ('value', 'claimed', 'done', 'result')
+
+    def __init__(self, value):
+        self.value = value
+        self.claimed = False
+        self.done = False
+        self.result = None
+
+
+class WriteCoalescer:
+    """
+    Class representing the write path of a client suppressing redundant writes and merging concurrent ones
+
+    Attributes
+    ----------
+    confirmed : dict
+        Last value confirmed by the device keyed by (address, parameter_id, part)
+    sent : int
+        Number of write requests sent
+    suppressed : int
+        Number of writes dropped because the value was already confirmed
+    coalesced : int
+        Number of writes merged into another one
+    """
+
+    def __init__(self, write):
+        """
+        Parameters
+        ----------
+        write : callable
+            Called as write(address, parameter_id, part, value, timeout) to send a write request and wait for its
+            response, returns the written Parameter identifier and raises StuCanPublicError or Timeout on failure
+
+        Example
+        -------
+        .. code-block:: python
+
+            with StuCanPublicClient(0x00, CAN_BUS_SPEED, bustype='kvaser', coalesce_writes=True) as client:
+                while True:
+                    # only written when the setpoint changes
+                    client.write_parameter(XT_1_DEVICE_ID, 1107, PARAMETER_PART_RAM, compute_setpoint())
+        """
+        self.send = write
+        self.cv = Condition()
+        self.confirmed = {}
+        self.in_flight = {}
+        self.sent = 0
+        self.suppressed = 0
+        self.coalesced = 0
+
+    def write(self, address, parameter_id, part, value, timeout=1):
+        """
+        Write a Parameter unless the value is already confirmed, waiting for the write in flight of the same
+        Parameter to complete first. Writes made meanwhile by other threads are merged, the caller then gets the
+        result of the write carrying the last value
+
+        Parameters
+        ----------
+        address : int
+            Targeted device address
+
+        parameter_id : int
+            Parameter id number
+
+        part : int
+            PARAMETER_PART_FLASH or PARAMETER_PART_RAM
+
+        value : float
+            The value to write
+
+        timeout : float
+            Response timeout of each write request, a call may wait for the write in flight and then its own
+
+        Returns
+        -------
+        int
+            Parameter identifier that has been written
+        """
+        key = (address, parameter_id, part)
+        value = as_float32(value)
+        with self.cv:
+            slot = self.in_flight.get(key)
+            if slot is None:
+                if self._confirmed(key, value):
+                    self.suppressed += 1
+                    return parameter_id
+                batch = _WriteBatch(value)
+                self.in_flight[key] = slot = [batch, None]
+            else:
+                batch = slot[1]
+                if batch is None:
+                    batch = slot[1] = _WriteBatch(value)
+                else:
+                    self.coalesced += 1
+                    batch.value = value
+                # the first caller woken up once the batch is the current one sends it
+                while not batch.done and not (slot[0] is batch and not batch.claimed):
+                    self.cv.wait()
+                if batch.done:
+                    return self._outcome(batch, parameter_id)
+                if self._confirmed(key, batch.value):
+                    self.suppressed += 1
+                    self._complete(key, slot, batch, parameter_id, True)
+                    return parameter_id
+            batch.claimed = True
+            self.sent += 1
+        try:
+            result = self.send(address, parameter_id, part, batch.value, timeout)
+        except Exception as exception:
+            with self.cv:
+                self._complete(key, slot, batch, exception, False)
+            raise
+        with self.cv:
+            self._complete(key, slot, batch, result, True)
+        return result
+
+    def _confirmed(self, key, value):
+        address, parameter_id, part = key
+        if self.confirmed.get(key) != value:
+            return False
+        # a flash write also resets RAM, it is only redundant when RAM still holds the value as well
+        return part != PARAMETER_PART_FLASH or self.confirmed.get((address, parameter_id, PARAMETER_PART_RAM)) == value
+
+    def _complete(self, key, slot, batch, result, success):
+        address, parameter_id, part = key
+        batch.done = True
+        batch.result = result
+        if success:
+            self.confirmed[key] = batch.value
+            if part == PARAMETER_PART_FLASH:
+                # the device also applies a flash value to RAM
+                self.confirmed[(address, parameter_id, PARAMETER_PART_RAM)] = batch.value
+        else:
+            # a failed or timed out write may or may not have been applied
+            self.confirmed.pop(key, None)
+        if slot[1] is None:
+            del self.in_flight[key]
+        else:
+            slot[0], slot[1] = slot[1], None
+        self.cv.notify_all()
+
+    @staticmethod
+    def _outcome(batch, parameter_id):
+        if isinstance(batch.result, Exception):
+            raise batch.result
+        return parameter_id
+
+    def forget(self, address, parameter_id=None):
+        """
+        Forget the confirmed values of a device so that the next writes are sent whatever their value
+
+        Parameters
+        ----------
+        address : int
+            Device address, a group address forgets every device of the group
+
+        parameter_id : int
+            Parameter id number, None for every Parameter of the device
+        """
+        with self.cv:
+            for key in list(self.confirmed):
+                if (key[0] == address or group_of(key[0]) == address) and parameter_id in (None, key[1]):
+                    del self.confirmed[key]